@@ -4,16 +4,29 @@ Initialize the Nest Web integration
 :author: Doug Skrypa
 """
 
-from pathlib import Path
+import logging
+from functools import partial
+from importlib import import_module
+from typing import TYPE_CHECKING
 
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant
+from homeassistant.exceptions import ConfigEntryError
 from homeassistant.helpers.typing import ConfigType
 
-from nest_client.client import NestWebClient
-
 from .constants import DOMAIN, DATA_NEST_CONFIG
-from .device import NestWebDevice
+from .stats import StepTimer
+
+if TYPE_CHECKING:
+    from .device import NestWebDevice
+
+# Note: The modules that depend on nest_client, aiohttp, and the climate component are imported in the functions that
+# use them, so that loading this integration is cheap when it has no config entries.
+
+log = logging.getLogger(__name__)
+
+SLOW_SETUP_THRESHOLD = 10
+PLATFORMS = ('climate', 'sensor')
 
 
 async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
@@ -24,29 +37,96 @@ async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
 
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
-    """Set up Nest from legacy config entry."""
-    conf = hass.data.get(DATA_NEST_CONFIG, {})
-
-    if not (config_path := conf.get('config_path')):
-        # Note: importlib.resources.files did not work for this, I assume due to the way HACS installs the integration
-        config_path = Path(__file__).resolve().parent.joinpath('config', 'nest.cfg')
-        if config_path.is_file():
-            config_path = config_path.as_posix()
+    """Set up Nest from a config entry.  Values stored in the entry take precedence over the YAML config."""
+    conf = {**hass.data.get(DATA_NEST_CONFIG, {}), **entry.data}
+    timer = StepTimer()
+    with timer.step('import'):
+        # Importing these for the first time is slow enough that it should not happen on the event loop
+        await hass.async_add_executor_job(_import_modules)
+        from .device import NestWebDevice
+        from .services import async_register_services
+        from .session import ConnectionStats, client_accepts_session, create_session, create_client, default_config_path
+
+    # Finding and parsing the config file involves blocking I/O, so it happens in an executor
+    with timer.step('resolve_config'):
+        if not (config_path := conf.get('config_path')):
+            config_path = await hass.async_add_executor_job(default_config_path)
+
+    connection_stats = ConnectionStats()
+    with timer.step('create_client'):
+        session = None
+        dedicated, emulator = conf.get('dedicated_session', False), conf.get('emulator')
+        if client_accepts_session():
+            session = create_session(hass, connection_stats, dedicated=dedicated, emulator=emulator)
+        elif dedicated or emulator:
+            raise ConfigEntryError(
+                'The installed version of nest-client does not accept a shared session, which is required for the'
+                ' dedicated_session and emulator options'
+            )
         else:
-            config_path = None
+            log.debug(
+                'The installed version of nest-client does not accept a shared session - using its own session'
+                ' without connection statistics'
+            )
+            connection_stats.supported = False
+        client = await hass.async_add_executor_job(partial(create_client, config_path, conf.get('overrides'), session))
 
-    client = NestWebClient(config_path, overrides=conf.get('overrides'))
-    hass.data[DOMAIN] = nest_web_device = NestWebDevice(hass, conf, client)
-    success = await nest_web_device.initialize()
-    if not success:
-        return False
+    nest_web_device = NestWebDevice(hass, conf, client, entry.entry_id, session, connection_stats)
+    nest_web_device.setup_timer = timer
+    with timer.step('load_history'):
+        await nest_web_device.history.async_load()
+        if nest_web_device.runtime_statistics is not None:
+            await nest_web_device.runtime_statistics.async_load()
+    # Entities are created from cached objects when available; the live objects are loaded in the background
+    with timer.step('load_cache'):
+        cached = await nest_web_device.initialize_from_cache()
+    if not cached:
+        with timer.step('initialize'):
+            success = await nest_web_device.initialize()
+        if not success:
+            await nest_web_device.aclose()
+            return False
 
-    for module in ('climate', 'sensor'):
-        hass.async_create_task(hass.config_entries.async_forward_entry_setup(entry, module))
+    if timer.total > SLOW_SETUP_THRESHOLD:
+        log.warning(f'Setup of {entry.title} took {timer.total:.1f}s: {timer}')
+    else:
+        log.debug(f'Setup of {entry.title} took {timer.total:.3f}s: {timer}')
 
+    hass.data.setdefault(DOMAIN, {})[entry.entry_id] = nest_web_device
+    async_register_services(hass)
+    await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+    nest_web_device.start()
+    entry.async_on_unload(entry.add_update_listener(_async_update_listener))
     return True
 
 
+def _import_modules():
+    for module in ('device', 'services', 'session'):
+        import_module(f'.{module}', __name__)
+
+
+async def _async_update_listener(hass: HomeAssistant, entry: ConfigEntry):
+    """Reload the entry when its options change, so only the selected sensors are created"""
+    await hass.config_entries.async_reload(entry.entry_id)
+
+
+async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
+    unloaded = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
+    if unloaded:
+        nest_web_device = hass.data[DOMAIN].pop(entry.entry_id)  # type: NestWebDevice
+        await nest_web_device.aclose()
+        if not hass.data[DOMAIN]:
+            from .services import async_unregister_services
+
+            async_unregister_services(hass)
+    return unloaded
+
+
 async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry):
-    nest_web_device = hass.data[DOMAIN]  # type: NestWebDevice
-    await nest_web_device.aclose()
+    from .cache import ObjectCache
+    from .energy import async_remove_runtime_state
+    from .history import ReadingHistory
+
+    await ObjectCache(hass, entry.entry_id).async_remove()
+    await ReadingHistory(hass, entry.entry_id).async_remove()
+    await async_remove_runtime_state(hass, entry.entry_id)
@@ -0,0 +1,77 @@
+"""
+Circuit breaker for requests to the Nest web service
+
+:author: Doug Skrypa
+"""
+
+import logging
+from datetime import datetime, timedelta
+from random import uniform
+from typing import Optional
+
+__all__ = ['CircuitBreaker', 'jittered_backoff']
+log = logging.getLogger(__name__)
+
+
+def jittered_backoff(attempt: int, base: float, maximum: float) -> float:
+    """
+    :param attempt: The number of consecutive failed attempts so far (1 for the first failure)
+    :param base: The delay, in seconds, before the first retry
+    :param maximum: The maximum delay, in seconds
+    :return: An exponentially increasing delay with random jitter, so that retries from many clients do not align
+    """
+    delay = min(maximum, base * 2 ** (attempt - 1))
+    return uniform(delay / 2, delay)
+
+
+class CircuitBreaker:
+    """
+    Stops requests after ``threshold`` consecutive failures.  While open, requests should be skipped until the retry
+    time has passed, after which a single trial request is allowed.  Each failure while tripped pushes the next retry
+    further out, with jittered exponential backoff.
+    """
+
+    def __init__(self, threshold: int = 3, base_delay: float = 30, max_delay: float = 1800):
+        self.threshold = threshold
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.consecutive_failures = 0
+        self.trips = 0
+        self.retry_at: Optional[datetime] = None
+
+    @property
+    def tripped(self) -> bool:
+        """True while the failure threshold has been reached, until a request succeeds again"""
+        return self.consecutive_failures >= self.threshold
+
+    @property
+    def is_open(self) -> bool:
+        """True while requests should be skipped"""
+        return self.retry_at is not None and datetime.now() < self.retry_at
+
+    @property
+    def retry_delay(self) -> Optional[timedelta]:
+        if self.retry_at is None:
+            return None
+        return max(timedelta(), self.retry_at - datetime.now())
+
+    def record_success(self):
+        if self.tripped:
+            log.info(f'Nest web service requests succeeded again after {self.consecutive_failures} failures')
+        self.consecutive_failures = 0
+        self.retry_at = None
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if not self.tripped:
+            return
+
+        if self.consecutive_failures == self.threshold:
+            self.trips += 1
+        attempt = self.consecutive_failures - self.threshold + 1
+        delay = jittered_backoff(attempt, self.base_delay, self.max_delay)
+        self.retry_at = datetime.now() + timedelta(seconds=delay)
+        log.warning(
+            f'Nest web service requests failed {self.consecutive_failures} consecutive times'
+            f' - will not retry for {delay:.0f}s'
+        )
@@ -0,0 +1,133 @@
+"""
+Persistent cache of the Nest objects that entities are created from
+
+:author: Doug Skrypa
+"""
+
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Callable, Collection, Optional, Union
+
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP
+from homeassistant.core import CALLBACK_TYPE, Event, HomeAssistant, callback
+from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.helpers.storage import Store
+
+from nest_client.client import NestWebClient
+from nest_client.entities import NestObject, Structure, ThermostatDevice, Shared
+
+from .constants import DOMAIN
+
+__all__ = ['ObjectCache', 'ThermostatGroup']
+log = logging.getLogger(__name__)
+
+STORAGE_VERSION = 1
+STORAGE_KEY_PREFIX = f'{DOMAIN}.objects'
+SAVE_INTERVAL = timedelta(minutes=5)
+
+ThermostatGroup = tuple[Structure, ThermostatDevice, Shared]
+
+
+class ObjectCache:
+    """
+    Stores the last known state of each structure/device/shared object so that entities can be created immediately on
+    startup, even if the Nest web service is slow or unavailable.
+    """
+
+    def __init__(self, hass: HomeAssistant, entry_id: str):
+        self.hass = hass
+        self._store = Store(hass, STORAGE_VERSION, f'{STORAGE_KEY_PREFIX}.{entry_id}')
+        self._pending: Optional[Callable[[], dict[str, Any]]] = None
+        self._unsub_save: list[CALLBACK_TYPE] = []
+
+    async def async_load(
+        self, nest: NestWebClient
+    ) -> tuple[list[ThermostatGroup], list[NestObject], Optional[datetime]]:
+        """
+        :return: The cached thermostat groups, the cached schedule objects for those thermostats, and when the cached
+          objects were last refreshed (None if unknown)
+        """
+        if not (data := await self._store.async_load()):
+            return [], [], None
+
+        try:
+            groups = [
+                tuple(NestObject.from_dict(raw_obj, nest) for raw_obj in raw_group)  # noqa
+                for raw_group in data['groups']
+            ]
+        except (KeyError, TypeError, ValueError) as e:
+            log.warning(f'Ignoring invalid cached Nest objects: {e}')
+            return [], [], None
+
+        try:
+            schedules = [NestObject.from_dict(raw_obj, nest) for raw_obj in data.get('schedules', ())]
+        except (KeyError, TypeError, ValueError) as e:
+            log.warning(f'Ignoring invalid cached Nest schedules: {e}')
+            schedules = []
+
+        try:
+            refreshed = datetime.fromisoformat(data['refreshed'])
+        except (KeyError, TypeError, ValueError):
+            refreshed = None  # Caches saved by older versions did not include this
+        return groups, schedules, refreshed
+
+    async def async_remove(self):
+        await self._store.async_remove()
+
+    @callback
+    def start(self):
+        """Save the latest scheduled objects every SAVE_INTERVAL, and when Home Assistant stops"""
+        if not self._unsub_save:
+            self._unsub_save = [
+                async_track_time_interval(self.hass, self._handle_save, SAVE_INTERVAL),
+                self.hass.bus.async_listen(EVENT_HOMEASSISTANT_STOP, self._handle_save),
+            ]
+
+    @callback
+    def stop(self):
+        for unsub in self._unsub_save:
+            unsub()
+        self._unsub_save = []
+
+    async def _handle_save(self, _now_or_event: Union[datetime, Event]):
+        await self.async_flush()
+
+    async def async_flush(self):
+        """Write the objects from the latest scheduled save, if they were not written yet"""
+        if (data_func := self._pending) is not None:
+            self._pending = None
+            await self._store.async_save(data_func())
+
+    @callback
+    def async_schedule_save(
+        self, groups: list[ThermostatGroup], schedules: Collection[NestObject], refreshed: datetime
+    ):
+        """
+        Save the given objects at the next interval.  Only the objects from the latest call before each interval are
+        written.  The time that the objects were refreshed is saved with them, so the age of cached values is known
+        after a restart.
+        """
+        self._pending = lambda: self._serialize(groups, schedules, refreshed)
+
+    async def async_save(self, groups: list[ThermostatGroup], schedules: Collection[NestObject], refreshed: datetime):
+        self._pending = None
+        await self._store.async_save(self._serialize(groups, schedules, refreshed))
+
+    @classmethod
+    def _serialize(
+        cls, groups: list[ThermostatGroup], schedules: Collection[NestObject], refreshed: datetime
+    ) -> dict[str, Any]:
+        return {
+            'groups': [[cls._serialize_object(obj) for obj in group] for group in groups],
+            'schedules': [cls._serialize_object(obj) for obj in schedules],
+            'refreshed': refreshed.isoformat(),
+        }
+
+    @staticmethod
+    def _serialize_object(obj: NestObject) -> dict[str, Any]:
+        return {
+            'object_key': obj.key,
+            'object_revision': obj.revision,
+            'object_timestamp': obj.timestamp,
+            'value': obj.value,
+        }
@@ -5,42 +5,66 @@ Nest Web thermostat control
 """
 
 import logging
-from asyncio import sleep
-from datetime import datetime
+from functools import partial
+from typing import Awaitable, Callable
 
 from homeassistant.components.climate import ClimateEntity
 from homeassistant.components.climate.const import ATTR_TARGET_TEMP_HIGH, ATTR_TARGET_TEMP_LOW
 from homeassistant.components.climate.const import SUPPORT_FAN_MODE, FAN_AUTO, FAN_ON, FAN_OFF
 from homeassistant.components.climate.const import HVAC_MODE_AUTO, HVAC_MODE_COOL, HVAC_MODE_HEAT, HVAC_MODE_OFF
-from homeassistant.components.climate.const import PRESET_AWAY, PRESET_NONE, SUPPORT_PRESET_MODE
+from homeassistant.components.climate.const import CURRENT_HVAC_COOL, CURRENT_HVAC_HEAT, CURRENT_HVAC_IDLE
+from homeassistant.components.climate.const import CURRENT_HVAC_FAN, PRESET_AWAY, PRESET_ECO, PRESET_NONE
+from homeassistant.components.climate.const import SUPPORT_PRESET_MODE
 from homeassistant.components.climate.const import SUPPORT_TARGET_TEMPERATURE, SUPPORT_TARGET_TEMPERATURE_RANGE
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import ATTR_TEMPERATURE, TEMP_CELSIUS
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.dispatcher import async_dispatcher_connect
 from homeassistant.helpers.entity import DeviceInfo
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 
-from nest_client.exceptions import NestException
 from nest_client.entities import Structure, ThermostatDevice, Shared
 
-from .constants import DOMAIN, SIGNAL_NEST_UPDATE, ACTION_NEST_TO_HASS, FAN_MODES_NEST_TO_HASS
-from .constants import NEST_MODE_HEAT_COOL, MODE_HASS_TO_NEST, MODE_NEST_TO_HASS, TEMP_UNIT_MAP
-from .device import NestWebDevice
+from .constants import DOMAIN, TEMP_UNIT_MAP
+from .device import NestWebDevice, update_signal
 
 __all__ = ['NestThermostat', 'async_setup_entry']
 log = logging.getLogger(__name__)
 
+# Note: Not sure what actual mode values exist other than 'auto'
+FAN_MODES_NEST_TO_HASS = {'auto': FAN_AUTO, 'off': FAN_OFF, 'on': FAN_ON}
+FAN_MODES_HASS_TO_NEST = {v: k for k, v in FAN_MODES_NEST_TO_HASS.items()}
+
+# region Climate Constants
+NEST_MODE_HEAT_COOL = 'range'
+MODE_HASS_TO_NEST = {
+    HVAC_MODE_AUTO: NEST_MODE_HEAT_COOL,
+    HVAC_MODE_HEAT: 'heat',
+    HVAC_MODE_COOL: 'cool',
+    HVAC_MODE_OFF: 'off',
+}
+
+MODE_NEST_TO_HASS = {v: k for k, v in MODE_HASS_TO_NEST.items()}
+ACTION_NEST_TO_HASS = {
+    'off': CURRENT_HVAC_IDLE,
+    'heating': CURRENT_HVAC_HEAT,
+    'cooling': CURRENT_HVAC_COOL,
+    'fan running': CURRENT_HVAC_FAN,
+}
+PRESET_AWAY_AND_ECO = 'Away and Eco'
+PRESET_MODES = [PRESET_NONE, PRESET_AWAY, PRESET_ECO, PRESET_AWAY_AND_ECO]
+# endregion
+
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry, async_add_entities: AddEntitiesCallback):
     """Set up the Nest climate device based on a config entry."""
     # temp_unit = hass.config.units.temperature_unit
-    nest_web_dev = hass.data[DOMAIN]  # type: NestWebDevice
+    nest_web_dev = hass.data[DOMAIN][entry.entry_id]  # type: NestWebDevice
     all_devices = [
         NestThermostat(nest_web_dev, structure, device, shared)
         for structure, device, shared in nest_web_dev.struct_thermostat_groups
     ]
-    async_add_entities(all_devices, True)
+    async_add_entities(all_devices)
 
 
 class NestThermostat(ClimateEntity):  # noqa
@@ -55,6 +79,7 @@ class NestThermostat(ClimateEntity):  # noqa
         self.structure = structure
         self.device = device
         self.shared = shared
+        self._snapshot = None
         self._fan_modes = [FAN_ON, FAN_AUTO, FAN_OFF]
         self._support_flags = SUPPORT_TARGET_TEMPERATURE | SUPPORT_PRESET_MODE
         if shared.can_heat and shared.can_cool:
@@ -75,32 +100,49 @@ class NestThermostat(ClimateEntity):  # noqa
         self._update_attrs()
 
     def _update_attrs(self):
-        device, shared = self.device, self.shared
-        self._location = device.where
-        self._name = device.name
-        self._humidity = device.humidity
-        self._hvac_state = shared.hvac_state
-        # self._fan_running = shared.hvac_fan_state
-        self._fan_mode = device.fan.get('mode')
-        self._away = self.structure.away
-        self._temperature = shared._current_temperature
-        self._mode = mode = shared.target_temperature_type
-        self._target_temperature = shared._target_temp_range if mode == 'range' else shared._target_temperature
-        self._action = shared.hvac_state
+        snapshot = self._snapshot = self.nest_web_dev.snapshots[self.device.serial]
+        self._location = snapshot.where
+        self._name = snapshot.name
+        self._humidity = snapshot.humidity
+        self._hvac_state = snapshot.hvac_state
+        # self._fan_running = snapshot.hvac_fan_state
+        self._fan_mode = snapshot.fan_mode
+        self._away = snapshot.away
+        self._temperature = snapshot.current_temperature
+        self._mode = mode = snapshot.target_temperature_type
+        self._target_temperature = snapshot.target_temp_range if mode == 'range' else snapshot.target_temperature
+        self._action = snapshot.hvac_state
         # self._min_temperature, self._max_temperature = shared.allowed_temp_range
 
     @property
     def should_poll(self) -> bool:
-        return True
+        return False
 
     async def async_added_to_hass(self):
         """Register update signal handler."""
 
-        async def async_update_state():
-            """Update device state."""
-            await self.async_update_ha_state(True)
+        @callback
+        def async_update_state(groups: frozenset[str]):
+            """Update device state.  The climate entity uses every group, so it updates for any change."""
+            if objects := self.nest_web_dev.get_group(self.device.serial):
+                self.structure, self.device, self.shared = objects
+            self._update_attrs()
+            self.async_write_ha_state()
+
+        signal = update_signal(self.device.serial)
+        self.async_on_remove(async_dispatcher_connect(self.hass, signal, async_update_state))
 
-        self.async_on_remove(async_dispatcher_connect(self.hass, SIGNAL_NEST_UPDATE, async_update_state))
+        # Used by the nest_web.set_structure service to apply changes to many thermostats at once
+        self.nest_web_dev.thermostats[self.device.serial] = self
+        self.async_on_remove(partial(self.nest_web_dev.thermostats.pop, self.device.serial, None))
+
+    @property
+    def available(self) -> bool:
+        return self.nest_web_dev.available
+
+    @property
+    def extra_state_attributes(self):
+        return {'stale': self.nest_web_dev.stale}
 
     @property
     def supported_features(self):
@@ -112,13 +154,7 @@ class NestThermostat(ClimateEntity):  # noqa
 
     @property
     def device_info(self) -> DeviceInfo:
-        return DeviceInfo(
-            identifiers={(DOMAIN, self.device.serial)},
-            manufacturer='Nest',
-            model='Thermostat',
-            name=self.device.description,
-            sw_version=self.device.software_version,
-        )
+        return self._snapshot.device_info
 
     @property
     def name(self):
@@ -199,33 +235,37 @@ class NestThermostat(ClimateEntity):  # noqa
 
     # region Setter Methods
 
-    async def _register_state_changed(self):
-        self.nest_web_dev.last_command = datetime.now()
-        await sleep(5)
-        self.schedule_update_ha_state(True)
-        await sleep(self.nest_web_dev.refresh_interval.total_seconds() + 0.5)
-        self.schedule_update_ha_state(True)
+    @callback
+    def _send_command(self, setting: str, command: Callable[[], Awaitable], target: str = None, **attrs):
+        """
+        Queue the given command.  Bursts of commands for the same setting are merged, and a follow-up refresh is
+        scheduled in the background after they are sent, so service calls return immediately.  If optimistic updates
+        are enabled, the given attributes are applied right away so the new state is visible before it is confirmed.
+        """
+        self.nest_web_dev.commands.submit(self.device.serial, setting, command, target)
+        if attrs and self.nest_web_dev.optimistic:
+            for attr, value in attrs.items():
+                setattr(self, attr, value)
+            self.async_write_ha_state()
 
     async def async_set_temperature(self, **kwargs):
-        try:
-            await self._set_temp(
-                kwargs.get(ATTR_TARGET_TEMP_LOW), kwargs.get(ATTR_TARGET_TEMP_HIGH), kwargs.get(ATTR_TEMPERATURE)
-            )
-        except NestException as e:
-            log.error(f'An error occurred while setting temperature: {e}')
-        await self._register_state_changed()
-
-    async def _set_temp(self, low, high, temp):
+        low, high = kwargs.get(ATTR_TARGET_TEMP_LOW), kwargs.get(ATTR_TARGET_TEMP_HIGH)
+        temp = kwargs.get(ATTR_TEMPERATURE)
         if self._mode == NEST_MODE_HEAT_COOL and low is not None and high is not None:
-            await self.shared.set_temp_range(low, high, convert=False)
+            command = partial(self.shared.set_temp_range, low, high, convert=False)
+            self._send_command('temperature', command, _target_temperature=(low, high))
         elif temp is not None:
-            await self.shared.set_temp(temp, convert=False)
+            command = partial(self.shared.set_temp, temp, convert=False)
+            self._send_command('temperature', command, _target_temperature=temp)
         else:
             log.debug(f'Invalid set_temperature args for mode={self._mode} - {low=} {high=} {temp=}')
 
     async def async_set_hvac_mode(self, hvac_mode: str):
-        await self.shared.set_mode(MODE_HASS_TO_NEST[hvac_mode])
-        await self._register_state_changed()
+        mode = MODE_HASS_TO_NEST[hvac_mode]
+        # The target temperature is a (low, high) tuple in range mode, so it needs to be swapped along with the mode
+        shared = self.shared
+        target = shared._target_temp_range if mode == NEST_MODE_HEAT_COOL else shared._target_temperature
+        self._send_command('mode', partial(shared.set_mode, mode), _mode=mode, _target_temperature=target)
 
     async def async_set_preset_mode(self, preset_mode: str):
         if preset_mode == self.preset_mode:
@@ -234,19 +274,16 @@ class NestThermostat(ClimateEntity):  # noqa
         need_away = preset_mode == PRESET_AWAY
         is_away = self._away
         if is_away != need_away:
-            await self.structure.set_away(need_away)
-            await self._register_state_changed()
+            # Away is a structure setting, so only the last away command for a given structure needs to be sent
+            command = partial(self.structure.set_away, need_away)
+            self._send_command('away', command, self.structure.serial, _away=need_away)
 
     async def async_set_fan_mode(self, fan_mode: str):
         if self._has_fan:
             if fan_mode == FAN_ON:
-                await self.device.start_fan()  # TODO: Set/Configure duration
+                command = self.device.start_fan  # TODO: Set/Configure duration
             else:
-                await self.device.stop_fan()
-            await self._register_state_changed()
+                command = self.device.stop_fan
+            self._send_command('fan', command, _fan_mode=FAN_MODES_HASS_TO_NEST.get(fan_mode))
 
     # endregion
-
-    async def async_update(self):
-        if await self.nest_web_dev.maybe_refresh():
-            self._update_attrs()
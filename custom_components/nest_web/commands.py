@@ -0,0 +1,117 @@
+"""
+Debouncing queue for thermostat commands
+
+:author: Doug Skrypa
+"""
+
+import logging
+from asyncio import gather
+from datetime import datetime
+from typing import Awaitable, Callable, Optional
+
+from homeassistant.core import HomeAssistant, CALLBACK_TYPE, callback
+from homeassistant.helpers.event import async_call_later
+
+from .session import REQUEST_ERRORS
+
+__all__ = ['CommandQueue']
+log = logging.getLogger(__name__)
+
+Command = Callable[[], Awaitable]
+
+
+class CommandQueue:
+    """
+    Holds commands for a short window before sending them.  Only the most recent command for a given setting on a given
+    thermostat is sent, so a burst of calls (such as from dragging a slider) results in a single API call per setting.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        delay: float,
+        on_sent: Callable[[str], None],
+        on_pending: Callable[[str], None] = None,
+    ):
+        """
+        :param hass: The Home Assistant instance
+        :param delay: Seconds to wait for more commands before sending them
+        :param on_sent: Called with a thermostat's serial number after its commands were sent
+        :param on_pending: Called with a thermostat's serial number when a command is submitted for it, right before it
+          is sent, and again after it was sent, so that any refresh results obtained before then can be treated as stale
+        """
+        self.hass = hass
+        self.delay = delay
+        self.submitted = 0
+        self.sent = 0
+        self.failed = 0
+        self._on_sent = on_sent
+        self._on_pending = on_pending
+        self._pending: dict[tuple[str, str], tuple[str, str, Command]] = {}
+        self._cancel_flush: Optional[CALLBACK_TYPE] = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    @callback
+    def submit(self, serial: str, setting: str, command: Command, target: str = None):
+        """
+        Queue the given command, replacing any pending command for the same setting on the same target.
+
+        :param serial: The serial number of the thermostat that the command is for
+        :param setting: The name of the setting that the command will change
+        :param command: A callable that returns an awaitable that will send the command
+        :param target: The serial number of the object that the command modifies, if it is shared by multiple
+          thermostats (such as a structure).  Defaults to the thermostat's serial number.
+        """
+        self.submitted += 1
+        key = (target or serial, setting)
+        # Re-inserting moves the key to the end, so commands for a given thermostat are sent in the order last submitted
+        if self._pending.pop(key, None) is not None:
+            log.debug(f'Replacing pending {setting} command for {key[0]}')
+        self._pending[key] = (serial, setting, command)
+        if self._on_pending is not None:
+            self._on_pending(serial)
+        if self._cancel_flush is not None:
+            self._cancel_flush()
+        self._cancel_flush = async_call_later(self.hass, self.delay, self._handle_flush)
+
+    async def _handle_flush(self, _now: datetime):
+        self._cancel_flush = None
+        await self.flush()
+
+    async def flush(self):
+        """Send all pending commands.  Commands for different thermostats are sent concurrently."""
+        if self._cancel_flush is not None:
+            self._cancel_flush()
+            self._cancel_flush = None
+
+        pending, self._pending = self._pending, {}
+        if not pending:
+            return
+
+        serial_commands = {}
+        for serial, setting, command in pending.values():
+            serial_commands.setdefault(serial, []).append((setting, command))
+
+        await gather(*(self._send(serial, commands) for serial, commands in serial_commands.items()))
+        log.debug(f'Sent {len(pending)} commands - total: submitted={self.submitted}, sent={self.sent}')
+
+    async def _send(self, serial: str, commands: list[tuple[str, Command]]):
+        try:
+            for setting, command in commands:
+                self.sent += 1
+                if self._on_pending is not None:
+                    self._on_pending(serial)
+                try:
+                    await command()
+                    if self._on_pending is not None:
+                        # A refresh that started while the command was being sent may have returned the previous value
+                        self._on_pending(serial)
+                except REQUEST_ERRORS as e:
+                    self.failed += 1
+                    log.error(f'An error occurred while sending {setting} command for {serial}: {e}')
+        finally:
+            # A follow-up refresh is needed to replace optimistic state, even if some commands were not sent
+            self._on_sent(serial)
@@ -4,15 +4,118 @@ Config flow to configure Nest.
 
 from typing import Any, Optional
 
-from homeassistant.config_entries import ConfigFlow
+import voluptuous as vol
+from homeassistant.config_entries import ConfigEntry, ConfigFlow, OptionsFlow
+from homeassistant.const import CONF_NAME, CONF_STRUCTURE
+from homeassistant.core import callback
 from homeassistant.data_entry_flow import FlowResult
+from homeassistant.helpers import config_validation as cv
 
-from .constants import DOMAIN
+from .constants import DOMAIN, CONF_SENSORS, CONF_DEVICE_SENSORS
+
+CONF_CONFIG_PATH = 'config_path'
+CONF_DEVICE = 'device'
+CONF_USE_GLOBAL = 'use_global'
+ALL_DEVICES = 'all'
 
 
 class NestFlowHandler(ConfigFlow, domain=DOMAIN):
+    """Each entry represents a separate Nest account (config file) and/or set of structures, with its own client."""
+
     VERSION = 1
 
+    @staticmethod
+    @callback
+    def async_get_options_flow(config_entry: ConfigEntry) -> OptionsFlow:
+        return NestOptionsFlowHandler(config_entry)
+
     async def async_step_user(self, user_input: Optional[dict[str, Any]] = None) -> FlowResult:
         """Handle a flow initialized by the user."""
-        return self.async_create_entry(title='Nest Web', data={})
+        if user_input is None:
+            return self.async_show_form(
+                step_id='user',
+                data_schema=vol.Schema(
+                    {
+                        vol.Optional(CONF_NAME, default='Nest Web'): str,
+                        vol.Optional(CONF_CONFIG_PATH): str,
+                        vol.Optional(CONF_STRUCTURE): str,
+                    }
+                ),
+            )
+
+        data = {}
+        if config_path := user_input.get(CONF_CONFIG_PATH, '').strip():
+            data[CONF_CONFIG_PATH] = config_path
+        if structures := [name.strip() for name in user_input.get(CONF_STRUCTURE, '').split(',') if name.strip()]:
+            data[CONF_STRUCTURE] = structures
+
+        await self.async_set_unique_id(f'{data.get(CONF_CONFIG_PATH)}:{",".join(sorted(structures))}')
+        self._abort_if_unique_id_configured()
+        return self.async_create_entry(title=user_input.get(CONF_NAME) or 'Nest Web', data=data)
+
+
+class NestOptionsFlowHandler(OptionsFlow):
+    """
+    Select which thermostat sensors should be created, either for all devices or for a specific device.  Excluded
+    sensors are not created at all, and are removed from the entity registry.
+    """
+
+    def __init__(self, config_entry: ConfigEntry):
+        self.config_entry = config_entry
+        self._options = dict(config_entry.options)
+        self._serial = None
+
+    async def async_step_init(self, user_input: Optional[dict[str, Any]] = None) -> FlowResult:
+        if user_input is not None:
+            self._options[CONF_SENSORS] = user_input[CONF_SENSORS]
+            if (serial := user_input.get(CONF_DEVICE, ALL_DEVICES)) != ALL_DEVICES:
+                self._serial = serial
+                return await self.async_step_device()
+            return self.async_create_entry(title='', data=self._options)
+
+        variables = _sensor_variables()
+        devices = {ALL_DEVICES: 'All devices', **self._device_names()}
+        return self.async_show_form(
+            step_id='init',
+            data_schema=vol.Schema(
+                {
+                    vol.Optional(CONF_SENSORS, default=self._options.get(CONF_SENSORS, list(variables))): (
+                        cv.multi_select(variables)
+                    ),
+                    vol.Optional(CONF_DEVICE, default=ALL_DEVICES): vol.In(devices),
+                }
+            ),
+        )
+
+    async def async_step_device(self, user_input: Optional[dict[str, Any]] = None) -> FlowResult:
+        device_sensors = dict(self._options.get(CONF_DEVICE_SENSORS, {}))
+        if user_input is not None and CONF_USE_GLOBAL in user_input:
+            if user_input[CONF_USE_GLOBAL]:
+                device_sensors.pop(self._serial, None)
+            else:
+                device_sensors[self._serial] = user_input[CONF_SENSORS]
+            self._options[CONF_DEVICE_SENSORS] = device_sensors
+            return self.async_create_entry(title='', data=self._options)
+
+        default = device_sensors.get(self._serial, self._options[CONF_SENSORS])
+        return self.async_show_form(
+            step_id='device',
+            data_schema=vol.Schema(
+                {
+                    vol.Optional(CONF_USE_GLOBAL, default=self._serial not in device_sensors): bool,
+                    vol.Optional(CONF_SENSORS, default=default): cv.multi_select(_sensor_variables()),
+                }
+            ),
+            description_placeholders={'device': self._device_names().get(self._serial, self._serial)},
+        )
+
+    def _device_names(self) -> dict[str, str]:
+        if nest_web_dev := self.hass.data.get(DOMAIN, {}).get(self.config_entry.entry_id):
+            return {serial: snapshot.description for serial, snapshot in nest_web_dev.snapshots.items()}
+        return {}
+
+
+def _sensor_variables() -> dict[str, str]:
+    from .sensor import THERMOSTAT_SENSOR_CLASSES
+
+    return {var: var.replace('_', ' ').capitalize() for cls in THERMOSTAT_SENSOR_CLASSES for var in cls._types}
@@ -3,93 +3,674 @@
 """
 
 import logging
-from asyncio import Lock
+from asyncio import CancelledError, Lock, Semaphore, Task, gather
 from datetime import datetime, timedelta
+from time import monotonic
+from typing import TYPE_CHECKING, Any, Optional, Collection, Iterable
 
+from aiohttp import ClientSession
 from homeassistant.const import CONF_STRUCTURE
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, CALLBACK_TYPE, callback
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+from homeassistant.helpers.event import async_call_later
+from homeassistant.util import dt as dt_util
 
 from nest_client.client import NestWebClient
-from nest_client.entities import Structure
-from nest_client.exceptions import NestException
+from nest_client.entities import Structure, NestObject
 from nest_client.utils import format_duration
 
-from .constants import DOMAIN
+from .commands import CommandQueue
+from .breaker import CircuitBreaker
+from .cache import ObjectCache, ThermostatGroup
+from .constants import DOMAIN, SIGNAL_NEST_UPDATE, SIGNAL_NEST_STATS_UPDATE, SIGNAL_NEST_HISTORY_UPDATE
+from .constants import SIGNAL_NEST_SCHEDULE_UPDATE
+from .energy import RuntimeStatisticsImporter
+from .history import ReadingHistory, DEFAULT_CAPACITY
+from .push import PushListener
+from .schedule import ScheduleIndex
+from .session import REQUEST_ERRORS, ConnectionStats
+from .snapshot import ThermostatSnapshot
+from .stats import RefreshStats, StepTimer
 
-__all__ = ['NestWebDevice']
+if TYPE_CHECKING:
+    from .climate import NestThermostat
+
+__all__ = ['NestWebDevice', 'update_signal', 'stats_signal', 'history_signal', 'schedule_signal']
 log = logging.getLogger(__name__)
 
 MIN_REFRESH_INTERVAL = timedelta(seconds=15)
 DEFAULT_REFRESH_INTERVAL = 180
+DEFAULT_ACTIVE_REFRESH_INTERVAL = 60
+DEFAULT_MAX_REFRESH_INTERVAL = 900
+ACTIVE_HVAC_STATES = {'heating', 'cooling'}
+COMMAND_REFRESH_DELAY = 5
+DEFAULT_COMMAND_DELAY = 1
+DEFAULT_INIT_CONCURRENCY = 4
+DEFAULT_FAILURE_THRESHOLD = 3
+DEFAULT_MAX_STALE_AGE = 3600
+OBJECT_GROUPS = ('structure', 'device', 'shared')
+TRANSITION_REFRESH_DELAY = timedelta(seconds=90)
+
+
+def update_signal(serial: str) -> str:
+    """
+    The signal sent when any objects change for the given thermostat.  It is sent once per refresh, with the set of
+    groups (structure/device/shared) that changed, so each entity only writes its state once.
+    """
+    return f'{SIGNAL_NEST_UPDATE}_{serial}'
+
+
+def stats_signal(entry_id: str) -> str:
+    """The signal sent when refresh stats are updated for the given config entry"""
+    return f'{SIGNAL_NEST_STATS_UPDATE}_{entry_id}'
+
+
+def history_signal(serial: str) -> str:
+    """The signal sent when new readings were recorded in the history for the given thermostat"""
+    return f'{SIGNAL_NEST_HISTORY_UPDATE}_{serial}'
+
+
+def schedule_signal(entry_id: str) -> str:
+    """The signal sent when the next scheduled transition changes for any thermostat for the given config entry"""
+    return f'{SIGNAL_NEST_SCHEDULE_UPDATE}_{entry_id}'
+
+
+def _get_interval(conf, key: str, default: int) -> timedelta:
+    interval = timedelta(seconds=int(conf.get(key, default)))
+    if interval < MIN_REFRESH_INTERVAL:
+        log.warning(f'Invalid {DOMAIN}.{key} = {interval} - using default')
+        return timedelta(seconds=default)
+    return interval
 
 
 class NestWebDevice:
-    def __init__(self, hass: HomeAssistant, conf, nest: NestWebClient):
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        conf,
+        nest: NestWebClient,
+        entry_id: str,
+        session: ClientSession = None,
+        connection_stats: ConnectionStats = None,
+    ):
         """Init Nest Devices."""
         self.hass = hass
         self.nest = nest
-        self.refresh_interval = timedelta(seconds=int(conf.get('refresh_interval', DEFAULT_REFRESH_INTERVAL)))
-        if self.refresh_interval < MIN_REFRESH_INTERVAL:
-            log.warning(f'Invalid {DOMAIN}.refresh_interval = {self.refresh_interval} - using default')
-            self.refresh_interval = timedelta(seconds=DEFAULT_REFRESH_INTERVAL)
+        self.entry_id = entry_id
+        self.stats_signal = stats_signal(entry_id)
+        self.session = session
+        self.connection_stats = connection_stats or ConnectionStats()
+        self.refresh_stats = RefreshStats()
+        self.setup_timer = StepTimer()
+        self.history = ReadingHistory(hass, entry_id, int(conf.get('history_size', DEFAULT_CAPACITY)))
+        self.runtime_statistics = (
+            RuntimeStatisticsImporter(hass, entry_id, self.history, self._thermostat_names)
+            if conf.get('runtime_statistics', True)
+            else None
+        )
+        self.refresh_interval = _get_interval(conf, 'refresh_interval', DEFAULT_REFRESH_INTERVAL)
+        self.active_refresh_interval = _get_interval(conf, 'active_refresh_interval', DEFAULT_ACTIVE_REFRESH_INTERVAL)
+        self.max_refresh_interval = max(
+            self.refresh_interval, _get_interval(conf, 'max_refresh_interval', DEFAULT_MAX_REFRESH_INTERVAL)
+        )
+        self.current_refresh_interval = self.refresh_interval
+        self._idle_refreshes = 0
+        self.breaker = CircuitBreaker(int(conf.get('failure_threshold', DEFAULT_FAILURE_THRESHOLD)))
+        self.max_stale_age = timedelta(seconds=int(conf.get('max_stale_age', DEFAULT_MAX_STALE_AGE)))
+        self.optimistic = bool(conf.get('optimistic', True))
+        command_delay = float(conf.get('command_delay', DEFAULT_COMMAND_DELAY))
+        self.commands = CommandQueue(hass, command_delay, self.register_command, self.invalidate)
+        self.push = PushListener(hass, self._subscribe, self._handle_push_update) if conf.get('push') else None
         self.local_structure = conf.get(CONF_STRUCTURE)
+        self.init_concurrency = max(1, int(conf.get('init_concurrency', DEFAULT_INIT_CONCURRENCY)))
+        self.cache = ObjectCache(hass, entry_id)
+        self.live = False
         self.structures = []
-        self.struct_thermostat_groups = []
+        self.struct_thermostat_groups: list[ThermostatGroup] = []
+        self.groups_by_serial: dict[str, ThermostatGroup] = {}
+        self.snapshots: dict[str, ThermostatSnapshot] = {}
+        self.schedules = ScheduleIndex()
+        self.schedule_objects: dict[str, NestObject] = {}
+        self._schedule_revisions: dict[str, int] = {}
+        self.thermostats: dict[str, 'NestThermostat'] = {}
+        self._ignored_structures = False
         self.refresh_lock = Lock()
         self.last_refresh = datetime.now()
-        self.last_command = datetime.now()
+        self.last_command = datetime.min  # No commands have been sent yet, so refreshes start at the normal interval
+        self._cancel_scheduled_refresh: Optional[CALLBACK_TYPE] = None
+        self._cancel_command_refresh: Optional[CALLBACK_TYPE] = None
+        self._stopped = False
+        self._commanded_serials: set[str] = set()
+        self._revisions: dict[tuple[str, str], int] = {}
+        # Command sequence numbers are used to detect refresh results that were obtained before a command was sent
+        self._command_seq = 0
+        self._command_seqs: dict[str, int] = {}
+        self._push_seq = 0
+        self._in_flight: Optional[tuple[Task, Optional[set[str]], int]] = None
+        self._superseded = False
 
-    async def initialize(self):
+    async def initialize(self) -> bool:
+        """Load the selected structures' thermostats from the Nest web service"""
         log.info('Beginning NestWebDevice.initialize')
+        start = monotonic()
         try:
             init_id_obj_map = await self.nest.get_init_objects()
-            structures = [obj for obj in init_id_obj_map.values() if isinstance(obj, Structure)]
-            structure_names = {obj.name for obj in structures}
-            if self.local_structure is None:
-                self.local_structure = structure_names
-                self.structures = structures
-            else:
-                for structure in structures:
-                    if structure.name not in self.local_structure:
-                        log.debug(f'Ignoring {structure=} - not in {self.local_structure}')
-                    else:
-                        self.structures.append(structure)
-
-            for structure in self.structures:
-                for device, shared in (await structure.thermostats_and_shared()):
-                    self.struct_thermostat_groups.append((structure, device, shared))
-        except NestException as e:
+        except REQUEST_ERRORS as e:
             log.error(f'Connection error while attempting to access the Nest web service: {e}')
             return False
-        log.info('Finished NestWebDevice.initialize')
+
+        log.debug(f'Loaded {len(init_id_obj_map)} init objects in {format_duration(monotonic() - start)}')
+        structures = [obj for obj in init_id_obj_map.values() if isinstance(obj, Structure)]
+        if self.local_structure is None:
+            self.local_structure = {obj.name for obj in structures}
+        else:
+            for structure in structures:
+                if structure.name not in self.local_structure:
+                    log.debug(f'Ignoring {structure=} - not in {self.local_structure}')
+                    self._ignored_structures = True
+
+        structures = [structure for structure in structures if structure.name in self.local_structure]
+        semaphore = Semaphore(self.init_concurrency)
+        results = await gather(*(self._load_structure(structure, semaphore) for structure in structures))
+        if structures and all(result is None for result in results):
+            return False
+
+        groups = [group for result in results if result is not None for group in result]
+        if failed := {structure.name for structure, result in zip(structures, results) if result is None}:
+            # Keep any previously loaded (or cached) thermostats for structures that could not be loaded this time
+            groups.extend(group for group in self.struct_thermostat_groups if group[0].name in failed)
+
+        self._set_groups(groups)
+        self._set_schedules(obj for obj in init_id_obj_map.values() if obj.key.startswith('schedule.'))
+        if missing := set(self.groups_by_serial).difference(self.schedule_objects):
+            # Schedules are only available if the service includes their buckets in the init objects
+            log.warning(
+                f'No schedules were found for thermostats={sorted(missing)} - next setpoint predictions and refreshes'
+                ' after scheduled transitions will not be available for them'
+            )
+        self.live = True
+        self.last_refresh = datetime.now()
+        await self.cache.async_save(self.struct_thermostat_groups, self.schedule_objects.values(), self.last_refresh)
+        log.info(f'Finished NestWebDevice.initialize in {format_duration(monotonic() - start)}')
+        return True
+
+    async def _load_structure(self, structure: Structure, semaphore: Semaphore) -> Optional[list[ThermostatGroup]]:
+        async with semaphore:
+            start = monotonic()
+            try:
+                groups = [(structure, device, shared) for device, shared in await structure.thermostats_and_shared()]
+            except REQUEST_ERRORS as e:
+                log.error(f'Error loading thermostats for structure={structure.name!r}: {e}')
+                return None
+
+        elapsed = format_duration(monotonic() - start)
+        log.debug(f'Loaded {len(groups)} thermostats for structure={structure.name!r} in {elapsed}')
+        return groups
+
+    async def initialize_from_cache(self) -> bool:
+        """
+        Load the thermostats that were found during the last successful initialization so that entities can be created
+        without waiting for the Nest web service.  The live objects are loaded in the background after :meth:`.start`.
+        """
+        groups, schedules, refreshed = await self.cache.async_load(self.nest)
+        if not groups:
+            return False
+
+        # Staleness is measured from when the cached values were refreshed.  If that is unknown, they are treated as
+        # too old to be considered available until live values are loaded.
+        self.last_refresh = refreshed or datetime.min
+        log.info(f'Loaded {len(groups)} cached thermostats')
+        self._set_groups(groups)
+        self._set_schedules(schedules)
         return True
 
+    def _set_groups(self, groups: list[ThermostatGroup]):
+        self.struct_thermostat_groups = groups
+        self.structures = list({id(structure): structure for structure, _, _ in groups}.values())
+        self.groups_by_serial = {device.serial: (structure, device, shared) for structure, device, shared in groups}
+        self._find_changes()
+
+    def _set_schedules(self, objects: Iterable[NestObject]):
+        """Store the schedule objects for the selected thermostats, and index their upcoming transitions"""
+        self.schedule_objects = {
+            serial: obj for obj in objects if (serial := obj.key.split('.', 1)[1]) in self.groups_by_serial
+        }
+        self._update_schedule_predictions()
+
+    def get_group(self, serial: str) -> Optional[ThermostatGroup]:
+        """
+        Entities should use this to obtain the current objects for their thermostat when handling updates, since the
+        objects loaded from the cache are replaced once the live objects are loaded.
+        """
+        return self.groups_by_serial.get(serial)
+
+    async def _reconcile(self):
+        cached_serials = set(self.groups_by_serial)
+        if not await self.initialize():
+            log.warning('Unable to load live objects - will continue to use cached values and retry later')
+            self.breaker.record_failure()
+            self._dispatch_all()
+            return
+
+        self.breaker.record_success()
+        if set(self.groups_by_serial) != cached_serials:
+            log.warning('The available thermostats changed since they were cached - reload the integration to update')
+        if self.push is not None and not self._stopped:
+            self.push.start()
+        self._dispatch_all()
+
+    # region Availability
+
+    @property
+    def stale(self) -> bool:
+        """True while entities are serving cached values or values from before repeated refresh failures"""
+        return not self.live or self.breaker.tripped
+
+    @property
+    def available(self) -> bool:
+        """Stale values continue to be served until they are older than max_stale_age"""
+        return not self.stale or datetime.now() - self.last_refresh < self.max_stale_age
+
+    # endregion
+
+    # region Refresh Scheduling
+
+    @callback
+    def start(self):
+        """Start the refresh loop.  Entities do not poll - they are notified via SIGNAL_NEST_UPDATE instead."""
+        self._stopped = False
+        self.cache.start()
+        self.history.start()
+        if self.runtime_statistics is not None:
+            self.runtime_statistics.start()
+        if not self.live:
+            self._schedule_refresh(timedelta())
+            return
+        if self.push is not None:
+            self.push.start()
+        self._schedule_refresh()
+
+    @callback
+    def stop(self):
+        self._stopped = True
+        self.cache.stop()
+        self.history.stop()
+        if self.runtime_statistics is not None:
+            self.runtime_statistics.stop()
+        if self.push is not None:
+            self.push.stop()
+        if self._cancel_scheduled_refresh is not None:
+            self._cancel_scheduled_refresh()
+            self._cancel_scheduled_refresh = None
+        if self._cancel_command_refresh is not None:
+            self._cancel_command_refresh()
+            self._cancel_command_refresh = None
+
+    @callback
+    def _schedule_refresh(self, interval: timedelta = None):
+        if self._cancel_scheduled_refresh is not None:
+            self._cancel_scheduled_refresh()
+            self._cancel_scheduled_refresh = None
+        if self._stopped:
+            # A refresh that was in progress when this was stopped (e.g., during a reload) must not restart the loop
+            return
+        if interval is None:
+            self.current_refresh_interval = interval = self._next_refresh_interval()
+        log.debug(f'Next refresh will occur in {format_duration(interval.total_seconds())}')
+        delay = interval.total_seconds()
+        self._cancel_scheduled_refresh = async_call_later(self.hass, delay, self._handle_scheduled_refresh)
+
+    async def _handle_scheduled_refresh(self, _now: datetime):
+        self._cancel_scheduled_refresh = None
+        try:
+            if self.live:
+                await self.refresh()
+            else:
+                await self._reconcile()
+        except REQUEST_ERRORS as e:
+            log.error(f'Error refreshing known objects: {e}')
+        finally:
+            self._schedule_refresh()
+
+    def _next_refresh_interval(self) -> timedelta:
+        """
+        Refresh more frequently while a command was recently sent or any thermostat is heating/cooling, and back off
+        exponentially towards max_refresh_interval while everything is idle (which includes being away or off).  While
+        push updates are being received, polling is relaxed to max_refresh_interval.  After repeated failures, the
+        circuit breaker's retry delay takes precedence.
+        """
+        if (retry_delay := self.breaker.retry_delay) is not None:
+            return retry_delay
+        if datetime.now() - self.last_command < self.refresh_interval:
+            self._idle_refreshes = 0
+            return MIN_REFRESH_INTERVAL
+        elif self.push is not None and self.push.connected:
+            # Changes arrive via the subscribe request, so polling is only a fallback in case it silently stalls
+            return self.max_refresh_interval
+        elif any(shared.hvac_state in ACTIVE_HVAC_STATES for _, _, shared in self.struct_thermostat_groups):
+            self._idle_refreshes = 0
+            return self._until_transition(min(self.active_refresh_interval, self.refresh_interval))
+
+        interval = self.refresh_interval * 2**self._idle_refreshes
+        if interval < self.max_refresh_interval:
+            self._idle_refreshes += 1
+            return self._until_transition(interval)
+        return self._until_transition(self.max_refresh_interval)
+
+    def _until_transition(self, interval: timedelta) -> timedelta:
+        """
+        :param interval: The interval that would be used if no scheduled transitions were known
+        :return: The given interval, or a shorter one if a scheduled transition will occur before then, so that the new
+          setpoint is picked up shortly after it takes effect
+        """
+        if (transition_time := self.schedules.next_transition_time()) is None:
+            return interval
+        until_transition = transition_time - dt_util.now() + TRANSITION_REFRESH_DELAY
+        return max(MIN_REFRESH_INTERVAL, min(interval, until_transition))
+
+    @callback
+    def register_command(self, serial: str):
+        """
+        Schedule a follow-up refresh after a command was sent for the thermostat with the given serial.  Commands that
+        arrive before the follow-up refresh begins are coalesced into a single refresh.
+        """
+        self.last_command = datetime.now()
+        self._commanded_serials.add(serial)
+        if self._cancel_command_refresh is not None:
+            self._cancel_command_refresh()
+        self._cancel_command_refresh = async_call_later(self.hass, COMMAND_REFRESH_DELAY, self._handle_command_refresh)
+
+    async def _handle_command_refresh(self, _now: datetime):
+        self._cancel_command_refresh = None
+        try:
+            # Only the objects related to thermostats that received commands need to be refreshed here
+            await self.maybe_refresh(set(self._commanded_serials))
+        except REQUEST_ERRORS as e:
+            log.error(f'Error refreshing known objects after a command: {e}')
+        finally:
+            # The scheduled refresh may have been backed off while idle, so it should be rescheduled
+            self._schedule_refresh()
+
+    # endregion
+
     def needs_refresh(self) -> bool:
         # now = datetime.now()
         # return (now - self.last_refresh) >= self.refresh_interval or (now - self.last_command) >= MIN_REFRESH_INTERVAL
-        return (datetime.now() - self.last_refresh) >= self.refresh_interval or self.last_command > self.last_refresh
+        since_last = datetime.now() - self.last_refresh
+        return since_last >= self.current_refresh_interval or self.last_command > self.last_refresh
 
-    async def maybe_refresh(self) -> bool:
+    async def maybe_refresh(self, serials: Collection[str] = None) -> bool:
         if not self.needs_refresh():
             # log.debug('Refresh is not currently necessary')
             return False
         else:
-            await self.refresh()
+            await self.refresh(serials)
             return True
 
-    async def refresh(self):
+    def _get_objects(self, serials: Collection[str] = None) -> list[NestObject]:
+        """
+        :param serials: If specified, only objects related to thermostats with these serial numbers will be returned
+        :return: The unique structure/device/shared objects for the selected structures' thermostats
+        """
+        objects = {
+            (group, obj.serial): obj
+            for objs in self.struct_thermostat_groups
+            if serials is None or objs[1].serial in serials
+            for group, obj in zip(OBJECT_GROUPS, objs)
+        }
+        if serials is None:
+            objects.update((('schedule', serial), obj) for serial, obj in self.schedule_objects.items())
+        return list(objects.values())
+
+    async def refresh(self, serials: Collection[str] = None):
+        """
+        :param serials: If specified, only objects related to thermostats with these serial numbers will be refreshed.
+          Otherwise, all objects for the selected structures' thermostats (including their schedules) will be refreshed.
+        """
+        stats = self.refresh_stats
+        wait_start = monotonic()
         async with self.refresh_lock:  # Multiple threads may try at once; if late to acquire lock, return immediately
+            stats.lock_wait.add(monotonic() - wait_start)
+            if self.breaker.is_open:
+                stats.skipped_circuit_open += 1
+                return
+
             delta = datetime.now() - self.last_refresh
             too_soon = delta < MIN_REFRESH_INTERVAL
             if self.last_command < self.last_refresh and too_soon:
                 # log.debug(f'Skipping refresh - last_refresh={self.last_refresh.isoformat(" ")}')
+                stats.skipped_too_soon += 1
                 return
 
             cmd_info = f', but last_command={self.last_command.isoformat(" ")}' if too_soon else ''
             delta_str = format_duration(delta.total_seconds())
-            log.info(f'Refreshing known objects - last refresh was {delta_str} ago{cmd_info}')
-            await self.nest.refresh_known_objects()
+            start, bytes_before = monotonic(), self.connection_stats.bytes_received
+            seq = self._command_seq
+            # The request runs in its own task so that it can be cancelled if a command makes its results obsolete
+            task = self.hass.async_create_task(self._send_refresh_request(serials, delta_str, cmd_info))
+            self._in_flight = (task, set(serials) if serials else None, seq)
+            try:
+                await task
+            except CancelledError:
+                if not self._superseded:
+                    raise
+                stats.cancelled += 1
+                log.debug('Cancelled an in-flight refresh that was superseded by a command')
+                return
+            except REQUEST_ERRORS as e:
+                stats.record_failure(e)
+                self.breaker.record_failure()
+                async_dispatcher_send(self.hass, self.stats_signal)
+                if self.breaker.tripped:  # Entities need to update their staleness / availability
+                    self._dispatch_all()
+                raise
+            finally:
+                self._in_flight = None
+                self._superseded = False
+
+            stats.duration.add(monotonic() - start)
+            if self.connection_stats.supported:
+                stats.bytes_received.add(self.connection_stats.bytes_received - bytes_before)
             self.last_refresh = datetime.now()
+            recovered = self.breaker.tripped
+            self.breaker.record_success()
+
+        self._dispatch_changes(recovered, self._commanded_since(seq))
+        async_dispatcher_send(self.hass, self.stats_signal)
+        self.cache.async_schedule_save(self.struct_thermostat_groups, self.schedule_objects.values(), self.last_refresh)
+
+    async def _send_refresh_request(self, serials: Optional[Collection[str]], delta_str: str, cmd_info: str):
+        if serials:
+            log.info(f'Refreshing objects for {", ".join(sorted(serials))} - last refresh was {delta_str} ago')
+        elif self._ignored_structures:
+            log.info(f'Refreshing objects for selected structures - last refresh was {delta_str} ago{cmd_info}')
+        else:
+            log.info(f'Refreshing known objects - last refresh was {delta_str} ago{cmd_info}')
+
+        # Polling refreshes must not be long-polls: they hold refresh_lock, and would block until something changed.
+        # The client's refresh_known_objects does not accept this option, so the known objects are requested directly.
+        await self.nest.refresh_objects(objects := self._get_objects(serials or None), subscribe=False)
+        self.refresh_stats.objects_refreshed.add(len(objects))
+
+    # region Command Priority
+
+    @callback
+    def invalidate(self, serial: str):
+        """
+        Called when a command for the thermostat with the given serial is submitted, when it is sent, and again after it
+        was sent.  Any refresh results for that thermostat that were requested before this point are discarded instead
+        of being applied, so they cannot overwrite the requested (optimistic) state with the previous value.  If an
+        in-flight refresh only covers thermostats that were invalidated this way, then it is cancelled, since the
+        follow-up refresh after the command will replace it.
+        """
+        self._command_seq += 1
+        self._command_seqs[serial] = self._command_seq
+        if self._in_flight is None:
+            return
+
+        task, serials, seq = self._in_flight
+        if serials and not self._superseded and all(self._command_seqs.get(s, 0) > seq for s in serials):
+            self._superseded = True
+            task.cancel()
+
+    def _commanded_since(self, seq: int) -> set[str]:
+        """:return: The serials of thermostats that received commands after the given command sequence number"""
+        invalidated = {serial for serial, command_seq in self._command_seqs.items() if command_seq > seq}
+        if invalidated:
+            log.debug(f'Discarding refresh results for {", ".join(sorted(invalidated))} due to newer commands')
+            self.refresh_stats.discarded += 1
+        return invalidated
+
+    # endregion
+
+    # region Push Updates
+
+    async def _subscribe(self):
+        """Long-poll request that returns when any of the selected structures' objects change"""
+        self._push_seq = self._command_seq
+        await self.nest.refresh_objects(self._get_objects(), subscribe=True)
+
+    @callback
+    def _handle_push_update(self):
+        self.last_refresh = datetime.now()
+        self._dispatch_changes(invalidated=self._commanded_since(self._push_seq))
+
+    # endregion
+
+    # region Change Detection
+
+    def _find_changes(self, invalidated: Collection[str] = ()) -> set[tuple[str, str]]:
+        """
+        Compare the current revision of each structure/device/shared object with the revision that was observed during
+        the previous refresh, and update the snapshots for thermostats with any changed objects.
+
+        :param invalidated: Serials of thermostats whose refreshed values are stale due to newer commands.  Their
+          snapshots are not updated, and their objects' previous revisions are retained so that they will be considered
+          changed after the next refresh.
+        :return: The (group, serial) keys of objects that changed since the previous call
+        """
+        old_revisions = self._revisions
+        revisions = {}
+        for objects in self.struct_thermostat_groups:
+            stale = objects[1].serial in invalidated
+            for group, obj in zip(OBJECT_GROUPS, objects):
+                key = (group, obj.serial)
+                revisions[key] = old_revisions.get(key) if stale else obj.revision
+
+        changed = {key for key, revision in revisions.items() if old_revisions.get(key) != revision}
+        self._revisions = revisions
+
+        snapshots = self.snapshots
+        for objects in self.struct_thermostat_groups:
+            serial = objects[1].serial
+            if serial in invalidated and serial in snapshots:
+                continue
+            previous = snapshots.get(serial)
+            if previous is None or any((group, obj.serial) in changed for group, obj in zip(OBJECT_GROUPS, objects)):
+                snapshots[serial] = ThermostatSnapshot(*objects, previous)
+        return changed
+
+    @callback
+    def _dispatch_all(self, exclude: Collection[str] = ()):
+        all_groups = frozenset(OBJECT_GROUPS)
+        for serial in self.groups_by_serial:
+            if serial not in exclude:
+                async_dispatcher_send(self.hass, update_signal(serial), all_groups)
+
+    @callback
+    def _dispatch_changes(self, everything: bool = False, invalidated: Collection[str] = ()):
+        changed = self._find_changes(invalidated)
+        self.refresh_stats.objects_changed.add(len(changed))
+        for serial in self.history.record(self.snapshots.values()):
+            async_dispatcher_send(self.hass, history_signal(serial))
+        if self._update_schedule_predictions():
+            async_dispatcher_send(self.hass, schedule_signal(self.entry_id))
+        # Thermostats that received commands are always updated, to replace any optimistic state with confirmed values.
+        # Invalidated thermostats remain pending until a refresh that was requested after their commands completes.
+        commanded = self._commanded_serials.difference(invalidated)
+        self._commanded_serials.intersection_update(invalidated)
+        if everything:
+            self._dispatch_all(invalidated)
+            return
+        elif not changed and not commanded:
+            log.debug('No changes were found after refreshing known objects')
+            return
+
+        for objects in self.struct_thermostat_groups:
+            serial = objects[1].serial
+            if serial in invalidated:
+                continue
+            group_objects = zip(OBJECT_GROUPS, objects)
+            groups = [group for group, obj in group_objects if serial in commanded or (group, obj.serial) in changed]
+            if groups:
+                async_dispatcher_send(self.hass, update_signal(serial), frozenset(groups))
+
+    # endregion
+
+    # region Schedules
+
+    def _update_schedule_predictions(self) -> bool:
+        """
+        Re-parse any schedules that changed, and update the next predicted transition for each thermostat.
+
+        :return: True if any thermostat's next transition changed, False otherwise
+        """
+        for serial, obj in self.schedule_objects.items():
+            if self._schedule_revisions.get(serial) == obj.revision:
+                continue
+            try:
+                self.schedules.update(serial, obj.value)
+            except (AttributeError, KeyError, TypeError, ValueError) as e:
+                log.warning(f'Unable to parse the schedule for {serial}: {e}')
+            self._schedule_revisions[serial] = obj.revision
+
+        modes = {serial: snapshot.target_temperature_type for serial, snapshot in self.snapshots.items()}
+        return self.schedules.update_predictions(dt_util.now(), modes)
+
+    # endregion
+
+    def _thermostat_names(self) -> dict[str, str]:
+        return {device.serial: device.description for _, device, _ in self.struct_thermostat_groups}
+
+    def get_diagnostics(self) -> dict[str, Any]:
+        return {
+            'live': self.live,
+            'thermostats': len(self.struct_thermostat_groups),
+            'structures': len(self.structures),
+            'last_refresh': self.last_refresh.isoformat(),
+            'last_command': self.last_command.isoformat() if self.last_command > datetime.min else None,
+            'current_refresh_interval': self.current_refresh_interval.total_seconds(),
+            'next_transition': (transition := self.schedules.next_transition_time()) and transition.isoformat(),
+            'stale': self.stale,
+            'available': self.available,
+            'circuit_breaker': {
+                'consecutive_failures': self.breaker.consecutive_failures,
+                'trips': self.breaker.trips,
+                'retry_at': self.breaker.retry_at.isoformat() if self.breaker.retry_at else None,
+            },
+            'setup': self.setup_timer.as_dict(),
+            'refresh': self.refresh_stats.as_dict(),
+            'connections': self.connection_stats.as_dict(),
+            'commands': {
+                'submitted': self.commands.submitted,
+                'sent': self.commands.sent,
+                'failed': self.commands.failed,
+                'pending': self.commands.pending,
+            },
+            'history_samples': {serial: len(buffer) for serial, buffer in self.history.buffers.items()},
+            'runtime_statistics': None if self.runtime_statistics is None else self.runtime_statistics.as_dict(),
+            'push': None if self.push is None else self.push.as_dict(),
+        }
 
     async def aclose(self):
+        try:
+            await self.commands.flush()
+        except Exception:
+            # Pending commands must not prevent the timers, client, and session from being cleaned up
+            log.exception('Error sending pending commands while closing')
+        self.stop()
+        await self.cache.async_flush()
+        await self.history.async_save()
         await self.nest.aclose()
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
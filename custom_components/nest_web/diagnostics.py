@@ -0,0 +1,20 @@
+"""
+Diagnostics support for Nest Web
+
+:author: Doug Skrypa
+"""
+
+from typing import TYPE_CHECKING, Any
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .constants import DOMAIN
+
+if TYPE_CHECKING:
+    from .device import NestWebDevice
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, entry: ConfigEntry) -> dict[str, Any]:
+    nest_web_dev = hass.data[DOMAIN][entry.entry_id]  # type: NestWebDevice
+    return nest_web_dev.get_diagnostics()
@@ -0,0 +1,187 @@
+"""
+Incremental import of daily heating / cooling runtime into Home Assistant's long-term statistics
+
+:author: Doug Skrypa
+"""
+
+import logging
+from asyncio import Lock
+from datetime import date, datetime, timedelta, timezone, tzinfo
+from typing import Any, Callable, NamedTuple, Optional
+
+from homeassistant.const import UnitOfTime
+from homeassistant.core import HomeAssistant, CALLBACK_TYPE, callback
+from homeassistant.helpers.event import async_call_later
+from homeassistant.helpers.storage import Store
+from homeassistant.util import dt as dt_util
+
+from .constants import DOMAIN
+from .history import ReadingHistory
+
+__all__ = ['RuntimeStatisticsImporter', 'async_remove_runtime_state']
+log = logging.getLogger(__name__)
+
+STORAGE_VERSION = 1
+STORAGE_KEY_PREFIX = f'{DOMAIN}.runtime'
+INITIAL_DELAY = 300
+IMPORT_INTERVAL = 6 * 3600
+IMPORT_BATCH_SIZE = 100
+RUNTIME_KINDS = ('heating', 'cooling')
+
+
+class RuntimeDay(NamedTuple):
+    day: date
+    heating: float  # Seconds
+    cooling: float  # Seconds
+
+
+class RuntimeStatisticsImporter:
+    """
+    Periodically imports each thermostat's daily heating and cooling runtime as external long-term statistics, so that
+    runtime can be graphed on dashboards without querying the recorder's state history.
+
+    The daily runtime is computed from the local reading history, so it is an estimate based on the ``hvac_state`` that
+    was observed at each refresh rather than the thermostat's own runtime counters.  It is only as precise as the
+    polling interval - while refreshes are backed off during idle periods, up to ``max_refresh_interval`` of the start
+    of each heating or cooling run may not be counted.
+
+    The last day that was imported for each thermostat (the high-water mark) and the cumulative totals are saved, so
+    only complete days after that mark are computed and imported.  If every thermostat is already up to date through
+    yesterday, then nothing is computed at all.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        entry_id: str,
+        history: ReadingHistory,
+        get_thermostats: Callable[[], dict[str, str]],
+    ):
+        self.hass = hass
+        self.history = history
+        self._get_thermostats = get_thermostats  # Returns a mapping of serial to name
+        self._store = _get_store(hass, entry_id)
+        self._lock = Lock()
+        self._cancel_import: Optional[CALLBACK_TYPE] = None
+        self._running = False
+        self.high_water: dict[str, str] = {}  # serial: ISO date of the last imported day
+        self.sums: dict[str, dict[str, float]] = {}  # serial: {kind: cumulative hours}
+        self.imported_days = 0
+        self.last_import: Optional[datetime] = None
+
+    async def async_load(self):
+        if not (data := await self._store.async_load()):
+            return
+        try:
+            self.high_water = dict(data['high_water'])
+            self.sums = {serial: dict(sums) for serial, sums in data['sums'].items()}
+        except (KeyError, TypeError, ValueError) as e:
+            log.warning(f'Ignoring invalid stored runtime statistics state: {e}')
+
+    # region Import Scheduling
+
+    @callback
+    def start(self):
+        self._running = True
+        if self._cancel_import is None:
+            self._cancel_import = async_call_later(self.hass, INITIAL_DELAY, self._handle_import)
+
+    @callback
+    def stop(self):
+        self._running = False
+        if self._cancel_import is not None:
+            self._cancel_import()
+            self._cancel_import = None
+
+    async def _handle_import(self, _now: datetime):
+        self._cancel_import = None
+        try:
+            await self.async_import()
+        finally:
+            if self._running:
+                self._cancel_import = async_call_later(self.hass, IMPORT_INTERVAL, self._handle_import)
+
+    # endregion
+
+    async def async_import(self):
+        if 'recorder' not in self.hass.config.components:
+            log.debug('Skipping runtime statistics import because the recorder is not loaded')
+            return
+
+        async with self._lock:
+            now = dt_util.now()
+            today, yesterday = now.date(), (now - timedelta(days=1)).date().isoformat()
+            for serial, name in self._get_thermostats().items():
+                if (last := self.high_water.get(serial)) and last >= yesterday:
+                    continue  # Already up to date - there is nothing new to compute
+
+                days = self._get_days(serial, now.tzinfo)
+                new_days = [day for day in days if day.day < today and (not last or day.day.isoformat() > last)]
+                if new_days:
+                    self._import(serial, name, sorted(new_days), now.tzinfo)
+
+            self.last_import = now
+
+    def _get_days(self, serial: str, tz: tzinfo) -> list[RuntimeDay]:
+        return [RuntimeDay(day, *runtime) for day, runtime in self.history.daily_runtime(serial, tz).items()]
+
+    def _import(self, serial: str, name: str, days: list[RuntimeDay], tz: tzinfo):
+        # The recorder is always loaded before this is called, so this import does not add any import time
+        from homeassistant.components.recorder.statistics import async_add_external_statistics
+
+        sums = self.sums.setdefault(serial, {})
+        for kind in RUNTIME_KINDS:
+            metadata = {
+                'has_mean': False,
+                'has_sum': True,
+                'name': f'{name} {kind} runtime',
+                'source': DOMAIN,
+                'statistic_id': f'{DOMAIN}:{kind}_runtime_{serial.lower()}',
+                'unit_of_measurement': UnitOfTime.HOURS,
+            }
+            total, rows = sums.get(kind, 0.0), []
+            for day in days:
+                hours = getattr(day, kind) / 3600
+                total += hours
+                start = _hour_start(day.day, tz)
+                rows.append({'start': start, 'state': round(hours, 3), 'sum': round(total, 3)})
+
+            # Each call is queued as a separate recorder job, so a long backfill does not hold up the recorder
+            for i in range(0, len(rows), IMPORT_BATCH_SIZE):
+                end = i + IMPORT_BATCH_SIZE
+                async_add_external_statistics(self.hass, metadata, rows[i:end])
+            sums[kind] = total
+
+        self.high_water[serial] = days[-1].day.isoformat()
+        self.imported_days += len(days)
+        self._store.async_delay_save(self._serialize, 0)
+        log.debug(f'Imported {len(days)} days of runtime statistics for {serial} through {self.high_water[serial]}')
+
+    def _serialize(self) -> dict[str, Any]:
+        return {'high_water': self.high_water, 'sums': self.sums}
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            'high_water': self.high_water,
+            'imported_days': self.imported_days,
+            'last_import': (last_import := self.last_import) and last_import.isoformat(),
+        }
+
+
+def _hour_start(day: date, tz: tzinfo) -> datetime:
+    """
+    :return: The start of the first UTC hour that starts at or after local midnight on the given day.  Statistics must
+      start at the top of an hour, which local midnight is not in time zones with a 30 or 45 minute offset.  Rounding
+      down instead would place the day's statistics on the previous local day in those time zones.
+    """
+    midnight = datetime.combine(day, datetime.min.time(), tzinfo=tz).astimezone(timezone.utc)
+    hour_start = midnight.replace(minute=0, second=0, microsecond=0)
+    return hour_start if hour_start == midnight else hour_start + timedelta(hours=1)
+
+
+def _get_store(hass: HomeAssistant, entry_id: str) -> Store:
+    return Store(hass, STORAGE_VERSION, f'{STORAGE_KEY_PREFIX}.{entry_id}')
+
+
+async def async_remove_runtime_state(hass: HomeAssistant, entry_id: str):
+    await _get_store(hass, entry_id).async_remove()
@@ -0,0 +1,343 @@
+"""
+Local history of thermostat readings, and runtime statistics computed from it
+
+:author: Doug Skrypa
+"""
+
+import logging
+import sys
+from array import array
+from base64 import b64decode, b64encode
+from bisect import bisect_left
+from datetime import date, datetime, timedelta, tzinfo
+from math import isnan, nan
+from time import time
+from typing import TYPE_CHECKING, Any, Collection, Iterable, Optional, Union
+
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP
+from homeassistant.core import CALLBACK_TYPE, Event, HomeAssistant, callback
+from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.helpers.storage import Store
+
+from .constants import DOMAIN
+
+if TYPE_CHECKING:
+    from .snapshot import ThermostatSnapshot
+
+__all__ = ['ReadingBuffer', 'ReadingHistory']
+log = logging.getLogger(__name__)
+
+STORAGE_VERSION = 1
+STORAGE_KEY_PREFIX = f'{DOMAIN}.history'
+SAVE_INTERVAL = timedelta(minutes=15)
+DEFAULT_CAPACITY = 2880
+MIN_SAMPLE_INTERVAL = 60
+MAX_SAMPLE_GAP = 1800  # Intervals longer than this (e.g., while HA was stopped) are excluded from duty cycles
+DEFAULT_STATS_WINDOW = timedelta(hours=24)
+RATE_WINDOW = 3600
+
+# Field: array typecode
+FIELDS = {'timestamp': 'd', 'temperature': 'f', 'target': 'f', 'humidity': 'f', 'hvac': 'b'}
+HVAC_STATE_CODES = {'heating': 1, 'cooling': 2}
+
+
+class ReadingBuffer:
+    """
+    Fixed-capacity ring buffer of thermostat readings.  Each field is stored in a preallocated array, so the memory used
+    does not grow with the number of readings, and the history can be persisted as the raw bytes of each array.
+    """
+
+    __slots__ = ('capacity', '_columns', '_start', '_count')
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self._columns = {name: array(code, [0]) * capacity for name, code in FIELDS.items()}
+        self._start = 0
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(
+        self,
+        timestamp: float,
+        temperature: Optional[float],
+        target: Optional[float],
+        humidity: Optional[float],
+        hvac: int,
+    ):
+        if self._count < self.capacity:
+            index = (self._start + self._count) % self.capacity
+            self._count += 1
+        else:
+            index = self._start
+            self._start = (self._start + 1) % self.capacity
+
+        columns = self._columns
+        columns['timestamp'][index] = timestamp
+        columns['temperature'][index] = nan if temperature is None else temperature
+        columns['target'][index] = nan if target is None else target
+        columns['humidity'][index] = nan if humidity is None else humidity
+        columns['hvac'][index] = hvac
+
+    def last(self, name: str):
+        if not self._count:
+            return None
+        return self._columns[name][(self._start + self._count - 1) % self.capacity]
+
+    def column(self, name: str) -> array:
+        """:return: The values for the given field, in chronological order"""
+        column, start = self._columns[name], self._start
+        end = start + self._count
+        if end <= self.capacity:
+            return column[start:end]
+        return column[start:] + column[: end - self.capacity]
+
+    # region Persistence
+
+    def to_dict(self) -> dict[str, str]:
+        return {name: b64encode(_to_little_endian(self.column(name))).decode('ascii') for name in FIELDS}
+
+    @classmethod
+    def from_dict(cls, data: dict[str, str], capacity: int = DEFAULT_CAPACITY) -> 'ReadingBuffer':
+        buffer = cls(capacity)
+        columns = {}
+        for name, code in FIELDS.items():
+            column = array(code)
+            column.frombytes(b64decode(data[name]))
+            columns[name] = _to_little_endian(column)[-capacity:]  # Swapping is symmetric
+
+        if len({len(column) for column in columns.values()}) != 1:
+            raise ValueError('Inconsistent history field lengths')
+
+        buffer._count = count = len(columns['timestamp'])
+        for name, column in columns.items():
+            buffer._columns[name][:count] = column
+        return buffer
+
+    # endregion
+
+    # region Statistics
+
+    def statistics(self, window: timedelta = DEFAULT_STATS_WINDOW, now: float = None) -> dict[str, Any]:
+        now = time() if now is None else now
+        timestamps = self.column('timestamp')
+        start = bisect_left(timestamps, now - window.total_seconds())
+        timestamps = timestamps[start:]
+        temps = self.column('temperature')[start:]
+        hvac = self.column('hvac')[start:]
+        valid_temps = [temp for temp in temps if not isnan(temp)]
+        rate_start = bisect_left(timestamps, now - RATE_WINDOW)
+        return {
+            'samples': len(timestamps),
+            'heating_duty_cycle': _round(duty_cycle(timestamps, hvac, HVAC_STATE_CODES['heating'])),
+            'cooling_duty_cycle': _round(duty_cycle(timestamps, hvac, HVAC_STATE_CODES['cooling'])),
+            'temperature_rate': _round(rate_of_change(timestamps[rate_start:], temps[rate_start:]), 2),
+            'time_to_setpoint': _round(time_to_setpoint(timestamps, hvac), 0),
+            'temperature_min': _round(min(valid_temps)) if valid_temps else None,
+            'temperature_max': _round(max(valid_temps)) if valid_temps else None,
+            'temperature_mean': _round(sum(valid_temps) / len(valid_temps)) if valid_temps else None,
+        }
+
+    # endregion
+
+
+class ReadingHistory:
+    """
+    Records a reading for each thermostat after each refresh, and periodically persists the readings so that runtime
+    statistics are available without querying the recorder.
+    """
+
+    def __init__(self, hass: HomeAssistant, entry_id: str, capacity: int = DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.buffers: dict[str, ReadingBuffer] = {}
+        self._statistics: dict[str, dict[str, Any]] = {}
+        self.hass = hass
+        self._store = Store(hass, STORAGE_VERSION, f'{STORAGE_KEY_PREFIX}.{entry_id}')
+        self._dirty = False
+        self._unsub_save: list[CALLBACK_TYPE] = []
+
+    def record(self, snapshots: Iterable['ThermostatSnapshot']) -> list[str]:
+        """
+        Readings are only recorded when at least MIN_SAMPLE_INTERVAL has passed since the previous reading, or if the
+        HVAC state or target temperature changed, so frequent refreshes after commands do not displace older readings.
+
+        :return: The serial numbers of the thermostats for which readings were recorded
+        """
+        now = time()
+        recorded = []
+        for snapshot in snapshots:
+            if (buffer := self.buffers.get(snapshot.serial)) is None:
+                self.buffers[snapshot.serial] = buffer = ReadingBuffer(self.capacity)
+
+            hvac = HVAC_STATE_CODES.get(snapshot.hvac_state, 0)
+            target = snapshot.target_temperature
+            if buffer and now - buffer.last('timestamp') < MIN_SAMPLE_INTERVAL and hvac == buffer.last('hvac'):
+                last_target = buffer.last('target')
+                if (target is None and isnan(last_target)) or (target is not None and abs(target - last_target) < 0.05):
+                    continue
+
+            buffer.append(now, snapshot.current_temperature, target, snapshot.humidity, hvac)
+            recorded.append(snapshot.serial)
+
+        if recorded:
+            for serial in recorded:
+                self._statistics.pop(serial, None)
+            self._dirty = True  # Saved by the next periodic save, rather than a delayed save that each reading defers
+        return recorded
+
+    def get_statistics(self, serial: str) -> Optional[dict[str, Any]]:
+        """
+        :return: Statistics for the default window for the thermostat with the given serial.  Results are cached until
+          the next reading is recorded, so they are only computed once for all of a thermostat's sensors.
+        """
+        try:
+            return self._statistics[serial]
+        except KeyError:
+            pass
+        if (buffer := self.buffers.get(serial)) is None:
+            return None
+        self._statistics[serial] = statistics = buffer.statistics()
+        return statistics
+
+    def statistics(
+        self, window: timedelta = DEFAULT_STATS_WINDOW, serials: Collection[str] = None
+    ) -> dict[str, dict[str, Any]]:
+        now = time()
+        return {
+            serial: buffer.statistics(window, now)
+            for serial, buffer in self.buffers.items()
+            if not serials or serial in serials
+        }
+
+    def daily_runtime(self, serial: str, tz: tzinfo) -> dict[date, tuple[float, float]]:
+        """
+        :return: Mapping of local date to (heating, cooling) runtime in seconds, for each day that is fully covered by
+          the thermostat's history.  The oldest day is excluded, since readings from the start of it may have been
+          displaced, and so is the current day.
+        """
+        if not (buffer := self.buffers.get(serial)):
+            return {}
+        days = daily_runtime(buffer.column('timestamp'), buffer.column('hvac'), tz)
+        first, today = min(days, default=None), datetime.now(tz).date()
+        return {day: runtime for day, runtime in days.items() if day != first and day < today}
+
+    # region Persistence
+
+    @callback
+    def start(self):
+        """Save new readings every SAVE_INTERVAL, and when Home Assistant stops"""
+        if not self._unsub_save:
+            self._unsub_save = [
+                async_track_time_interval(self.hass, self._handle_save, SAVE_INTERVAL),
+                self.hass.bus.async_listen(EVENT_HOMEASSISTANT_STOP, self._handle_save),
+            ]
+
+    @callback
+    def stop(self):
+        for unsub in self._unsub_save:
+            unsub()
+        self._unsub_save = []
+
+    async def _handle_save(self, _now_or_event: Union[datetime, Event]):
+        if self._dirty:
+            await self.async_save()
+
+    async def async_load(self):
+        if not (data := await self._store.async_load()):
+            return
+        try:
+            self.buffers = {
+                serial: ReadingBuffer.from_dict(raw_buffer, self.capacity)
+                for serial, raw_buffer in data['buffers'].items()
+            }
+        except (KeyError, TypeError, ValueError) as e:
+            log.warning(f'Ignoring invalid stored thermostat history: {e}')
+        else:
+            log.debug(f'Loaded stored history for {len(self.buffers)} thermostats')
+
+    async def async_save(self):
+        if self.buffers:
+            self._dirty = False
+            await self._store.async_save(self._serialize())
+
+    async def async_remove(self):
+        await self._store.async_remove()
+
+    def _serialize(self) -> dict[str, Any]:
+        return {'buffers': {serial: buffer.to_dict() for serial, buffer in self.buffers.items()}}
+
+    # endregion
+
+
+# region Statistics Functions
+
+
+def duty_cycle(timestamps: array, hvac: array, code: int) -> Optional[float]:
+    """:return: The percentage of time spent in the HVAC state with the given code"""
+    active = total = 0.0
+    for i in range(1, len(timestamps)):
+        if (elapsed := timestamps[i] - timestamps[i - 1]) > MAX_SAMPLE_GAP:
+            continue
+        total += elapsed
+        if hvac[i - 1] == code:
+            active += elapsed
+    return 100 * active / total if total else None
+
+
+def rate_of_change(timestamps: array, values: array) -> Optional[float]:
+    """:return: The least-squares slope of the given values, in units per hour"""
+    points = [(ts, value) for ts, value in zip(timestamps, values) if not isnan(value)]
+    if len(points) < 2:
+        return None
+
+    mean_ts = sum(ts for ts, _ in points) / len(points)
+    mean_val = sum(value for _, value in points) / len(points)
+    if not (denominator := sum((ts - mean_ts) ** 2 for ts, _ in points)):
+        return None
+    return 3600 * sum((ts - mean_ts) * (value - mean_val) for ts, value in points) / denominator
+
+
+def time_to_setpoint(timestamps: array, hvac: array) -> Optional[float]:
+    """:return: The duration, in seconds, of the most recent complete heating or cooling run"""
+    last_duration = run_start = None
+    previous = None
+    for ts, code in zip(timestamps, hvac):
+        if code and previous == 0:
+            run_start = ts
+        elif not code and run_start is not None:
+            last_duration = ts - run_start
+            run_start = None
+        previous = code
+    return last_duration
+
+
+def daily_runtime(timestamps: array, hvac: array, tz: tzinfo) -> dict[date, tuple[float, float]]:
+    """:return: Mapping of local date to (heating, cooling) runtime in seconds, counted on the day each run began"""
+    heating_code, cooling_code = HVAC_STATE_CODES['heating'], HVAC_STATE_CODES['cooling']
+    days = {}
+    for i in range(1, len(timestamps)):
+        if (elapsed := timestamps[i] - timestamps[i - 1]) > MAX_SAMPLE_GAP:
+            continue
+        day = datetime.fromtimestamp(timestamps[i - 1], tz).date()
+        heating, cooling = days.get(day, (0.0, 0.0))
+        if hvac[i - 1] == heating_code:
+            heating += elapsed
+        elif hvac[i - 1] == cooling_code:
+            cooling += elapsed
+        days[day] = (heating, cooling)
+    return days
+
+
+def _round(value: Optional[float], digits: int = 1) -> Optional[float]:
+    return None if value is None else round(value, digits)
+
+
+def _to_little_endian(values: array) -> array:
+    if sys.byteorder != 'little':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values
+
+
+# endregion
@@ -0,0 +1,100 @@
+"""
+Long-poll based push updates
+
+:author: Doug Skrypa
+"""
+
+import logging
+from asyncio import CancelledError, Task, sleep
+from time import monotonic
+from typing import Any, Awaitable, Callable, Optional
+
+from homeassistant.core import HomeAssistant, callback
+
+from .breaker import jittered_backoff
+from .session import REQUEST_ERRORS
+
+__all__ = ['PushListener']
+log = logging.getLogger(__name__)
+
+MIN_SUBSCRIBE_DURATION = 5
+MAX_SHORT_RESPONSES = 5
+MIN_RECONNECT_DELAY = 1
+MAX_RECONNECT_DELAY = 300
+SHORT_RESPONSE_COOLDOWN = 1800
+
+
+class PushListener:
+    """
+    Keeps a long-lived subscribe request open, and calls ``on_update`` each time it returns with changes.  Failed
+    requests are retried with jittered exponential backoff.
+
+    If the subscribe requests return immediately, then the server is not holding them open, so the regular refresh
+    interval takes over again until the listener tries again after a cool-down period.
+    """
+
+    def __init__(self, hass: HomeAssistant, subscribe: Callable[[], Awaitable], on_update: Callable[[], None]):
+        self.hass = hass
+        self.connected = False
+        self.updates = 0
+        self.failures = 0
+        self._subscribe = subscribe
+        self._on_update = on_update
+        self._task: Optional[Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def as_dict(self) -> dict[str, Any]:
+        return {'connected': self.connected, 'updates': self.updates, 'failures': self.failures}
+
+    @callback
+    def start(self):
+        if not self.running:
+            self._task = self.hass.async_create_background_task(self._run(), 'nest_web push listener')
+
+    @callback
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self.connected = False
+
+    async def _run(self):
+        try:
+            await self._listen()
+        finally:
+            # Polling is relaxed while connected, so this must not remain set if the listener ends for any reason
+            self.connected = False
+
+    async def _listen(self):
+        consecutive_failures = short_responses = 0
+        while True:
+            started = monotonic()
+            self.connected = True
+            try:
+                await self._subscribe()
+            except CancelledError:
+                raise
+            except REQUEST_ERRORS as e:
+                self.connected = False
+                self.failures += 1
+                consecutive_failures += 1
+                delay = jittered_backoff(consecutive_failures, MIN_RECONNECT_DELAY, MAX_RECONNECT_DELAY)
+                log.warning(f'Subscribe request failed: {e} - reconnecting in {delay:.1f}s')
+                await sleep(delay)
+                continue
+
+            consecutive_failures = 0
+            self.updates += 1
+            self._on_update()
+            if monotonic() - started >= MIN_SUBSCRIBE_DURATION:
+                short_responses = 0
+            elif (short_responses := short_responses + 1) >= MAX_SHORT_RESPONSES:
+                log.warning(f'Subscribe requests are not being held open - polling for {SHORT_RESPONSE_COOLDOWN}s')
+                self.connected = False
+                short_responses = 0
+                await sleep(SHORT_RESPONSE_COOLDOWN)
+            else:
+                await sleep(MIN_SUBSCRIBE_DURATION)
@@ -0,0 +1,115 @@
+"""
+Index of upcoming thermostat schedule transitions
+
+:author: Doug Skrypa
+"""
+
+import logging
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from typing import Any, NamedTuple, Optional
+
+__all__ = ['ScheduleIndex', 'Transition']
+log = logging.getLogger(__name__)
+
+SECONDS_PER_DAY = 86400
+SECONDS_PER_WEEK = 7 * SECONDS_PER_DAY
+
+
+class Transition(NamedTuple):
+    """A scheduled setpoint change"""
+
+    at: datetime
+    mode: str  # heat / cool / range
+    temperature: Optional[float] = None
+    low: Optional[float] = None
+    high: Optional[float] = None
+
+
+class _Entry(NamedTuple):
+    week_seconds: int  # Seconds since midnight on Monday
+    mode: str
+    temperature: Optional[float]
+    low: Optional[float]
+    high: Optional[float]
+
+
+class ScheduleIndex:
+    """
+    Parsed weekly schedules for each thermostat, sorted by the time of week at which each setpoint takes effect, so the
+    next transition can be found with a binary search.
+
+    Schedule times are interpreted in Home Assistant's local time zone, which is assumed to match the structure's.
+    """
+
+    def __init__(self):
+        self._entries: dict[str, list[_Entry]] = {}
+        self._offsets: dict[str, list[int]] = {}
+        self._modes: dict[str, str] = {}
+        self.predictions: dict[str, Optional[Transition]] = {}
+
+    def __contains__(self, serial: str) -> bool:
+        return serial in self._entries
+
+    def update(self, serial: str, schedule: dict[str, Any]):
+        """Parse the value of the schedule bucket for the thermostat with the given serial"""
+        entries = []
+        for day, day_entries in (schedule.get('days') or {}).items():
+            for entry in day_entries.values():
+                if entry.get('entry_type', 'setpoint') != 'setpoint':
+                    continue  # Continuation entries repeat the previous day's last setpoint at midnight
+                entries.append(
+                    _Entry(
+                        int(day) * SECONDS_PER_DAY + int(entry['time']),
+                        entry['type'].lower(),
+                        entry.get('temp'),
+                        entry.get('temp-min'),
+                        entry.get('temp-max'),
+                    )
+                )
+
+        entries.sort()
+        self._entries[serial] = entries
+        self._offsets[serial] = [entry.week_seconds for entry in entries]
+        self._modes[serial] = (schedule.get('schedule_mode') or '').lower()
+        log.debug(f'Loaded {len(entries)} schedule entries for {serial}')
+
+    def next_transition(self, serial: str, now: datetime, mode: str = None) -> Optional[Transition]:
+        """
+        :param serial: The serial number of a thermostat
+        :param now: The current local time
+        :param mode: The thermostat's current mode.  If it differs from the schedule's mode, then the schedule is not
+          being followed, and None is returned.
+        :return: The next scheduled transition after the given time, if any
+        """
+        if not (entries := self._entries.get(serial)):
+            return None
+        if mode is not None and mode != self._modes[serial]:
+            return None
+
+        midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        week_start = midnight - timedelta(days=now.weekday())
+        now_offset = int((now - week_start).total_seconds())
+        index = bisect_right(self._offsets[serial], now_offset)
+        if index < len(entries):
+            entry, week_offset = entries[index], 0
+        else:
+            entry, week_offset = entries[0], SECONDS_PER_WEEK
+
+        at = week_start + timedelta(seconds=entry.week_seconds + week_offset)
+        return Transition(at, entry.mode, entry.temperature, entry.low, entry.high)
+
+    def update_predictions(self, now: datetime, modes: dict[str, Optional[str]]) -> bool:
+        """
+        :param now: The current local time
+        :param modes: Mapping of serial number to the thermostat's current mode
+        :return: True if any thermostat's next transition changed, False otherwise
+        """
+        predictions = {serial: self.next_transition(serial, now, mode) for serial, mode in modes.items()}
+        changed = predictions != self.predictions
+        self.predictions = predictions
+        return changed
+
+    def next_transition_time(self) -> Optional[datetime]:
+        """:return: The time of the earliest predicted transition for any thermostat"""
+        return min((transition.at for transition in self.predictions.values() if transition), default=None)
@@ -6,33 +6,66 @@ Nest Web thermostat sensors
 
 import logging
 from functools import cached_property
+from typing import Collection, Optional
 
-from homeassistant.components.sensor import SensorEntity
+from homeassistant.components.sensor import SensorDeviceClass, SensorEntity
 from homeassistant.components.binary_sensor import BinarySensorEntity
 from homeassistant.const import PERCENTAGE, DEVICE_CLASS_HUMIDITY, DEVICE_CLASS_TEMPERATURE, TEMP_CELSIUS
-from homeassistant.core import HomeAssistant
+from homeassistant.const import UnitOfInformation, UnitOfTime
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.dispatcher import async_dispatcher_connect
-from homeassistant.helpers.entity import DeviceInfo, Entity
+from homeassistant.helpers.device_registry import DeviceEntryType
+from homeassistant.helpers.entity import DeviceInfo, Entity, EntityCategory
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.entity_registry import async_get as async_get_entity_registry
 
 from nest_client.entities import Structure, ThermostatDevice, Shared
 
-from .constants import DOMAIN, SIGNAL_NEST_UPDATE, TEMP_UNIT_MAP
-from .device import NestWebDevice
+from .constants import DOMAIN, CONF_SENSORS, CONF_DEVICE_SENSORS, TEMP_UNIT_MAP
+from .device import NestWebDevice, update_signal, stats_signal, history_signal, schedule_signal
+from .stats import RollingHistogram
 
 log = logging.getLogger(__name__)
 
 
-async def async_setup_entry(hass: HomeAssistant, entry, async_add_entities: AddEntitiesCallback) -> None:
+async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry, async_add_entities: AddEntitiesCallback) -> None:
     """Set up a Nest sensor based on a config entry."""
-    nest_web_dev = hass.data[DOMAIN]  # type: NestWebDevice
-    all_sensors = [
-        cls(nest_web_dev, structure, device, shared, var)
-        for structure, device, shared in nest_web_dev.struct_thermostat_groups
-        for cls in (NestBasicSensor, NestTempSensor, NestBinarySensor)
-        for var in cls._types
-    ]
-    async_add_entities(all_sensors, True)
+    nest_web_dev = hass.data[DOMAIN][entry.entry_id]  # type: NestWebDevice
+    all_sensors = []
+    excluded_ids = set()
+    for structure, device, shared in nest_web_dev.struct_thermostat_groups:
+        enabled = _enabled_variables(entry.options, device.serial)
+        for cls in THERMOSTAT_SENSOR_CLASSES:
+            for var in cls._types:
+                if enabled is None or var in enabled:
+                    all_sensors.append(cls(nest_web_dev, structure, device, shared, var))
+                else:
+                    excluded_ids.add(f'{device.serial}-{var}')
+
+    if excluded_ids:
+        _remove_excluded(hass, entry, excluded_ids)
+
+    all_sensors.extend(NestRefreshStatSensor(nest_web_dev, entry.entry_id, var) for var in NestRefreshStatSensor._types)
+    async_add_entities(all_sensors)
+
+
+def _enabled_variables(options, serial: str) -> Optional[set[str]]:
+    """
+    :return: The sensor variables that should be created for the thermostat with the given serial, or None for all
+    """
+    if (variables := options.get(CONF_DEVICE_SENSORS, {}).get(serial)) is None:
+        variables = options.get(CONF_SENSORS)
+    return None if variables is None else set(variables)
+
+
+def _remove_excluded(hass: HomeAssistant, entry: ConfigEntry, unique_ids: set[str]):
+    """Remove previously created entities for sensors that are now excluded so they do not linger as orphans"""
+    registry = async_get_entity_registry(hass)
+    for entity_id, reg_entry in list(registry.entities.items()):
+        if reg_entry.config_entry_id == entry.entry_id and reg_entry.unique_id in unique_ids:
+            log.debug(f'Removing excluded sensor {entity_id}')
+            registry.async_remove(entity_id)
 
 
 class NestSensorDevice(Entity):
@@ -48,11 +81,13 @@ class NestSensorDevice(Entity):
         self.device = device
         self.shared = shared
         self._name = '{} {}'.format(device.description, variable.replace('_', ' '))
+        self._snapshot = None
         self._state = None
         self._unit = None
+        self._update_attrs()
 
     def _update_attrs(self):
-        pass
+        self._snapshot = self.nest_web_dev.snapshots[self.device.serial]
 
     @property
     def name(self):
@@ -60,26 +95,33 @@ class NestSensorDevice(Entity):
 
     @property
     def should_poll(self) -> bool:
-        return True
+        return False
 
     @cached_property
     def unique_id(self):
         return f'{self.device.serial}-{self.variable}'
 
+    @property
+    def available(self) -> bool:
+        return self.nest_web_dev.available
+
+    @property
+    def extra_state_attributes(self):
+        return {'stale': self.nest_web_dev.stale}
+
     @property
     def device_info(self) -> DeviceInfo:
         """Return information about the device."""
-        if dev := self.device:
-            model = 'Thermostat' if dev.is_thermostat else 'Camera' if dev.is_camera else 'Nest Protect'
-        else:
-            model = None
-        return DeviceInfo(
-            identifiers={(DOMAIN, dev.serial)},
-            manufacturer='Nest',
-            model=model,
-            name=dev.description,
-            sw_version=dev.software_version,
-        )
+        return self._snapshot.device_info
+
+    @cached_property
+    def _group(self) -> str:
+        """The group of objects (structure/device/shared) that this sensor's value is read from"""
+        return 'shared'
+
+    @cached_property
+    def _signal(self) -> str:
+        return update_signal(self.device.serial)
 
     @cached_property
     def device_class(self):
@@ -89,28 +131,31 @@ class NestSensorDevice(Entity):
     def native_unit_of_measurement(self):
         return self._unit
 
-    async def async_update(self):
-        if await self.nest_web_dev.maybe_refresh():
-            self._update_attrs()
-
     async def async_added_to_hass(self):
         """Register update signal handler."""
 
-        async def async_update_state():
-            """Update sensor state."""
-            await self.async_update_ha_state(True)
+        @callback
+        def async_update_state(groups: Collection[str] = None):
+            """Update sensor state.  Update signals include the changed groups; other signals do not."""
+            if groups is None or self._group in groups:
+                self._update_attrs()
+                self.async_write_ha_state()
 
-        self.async_on_remove(async_dispatcher_connect(self.hass, SIGNAL_NEST_UPDATE, async_update_state))
+        self.async_on_remove(async_dispatcher_connect(self.hass, self._signal, async_update_state))
 
 
 class NestBasicSensor(NestSensorDevice, SensorEntity):
     _types = {'humidity': DEVICE_CLASS_HUMIDITY, 'hvac_state': None}
     _units = {'humidity': PERCENTAGE}
 
+    @cached_property
+    def _group(self) -> str:
+        return 'device' if self.variable == 'humidity' else 'shared'
+
     def _update_attrs(self):
+        super()._update_attrs()
         self._unit = self._units.get(self.variable)
-        obj = self.device if self.variable == 'humidity' else self.shared
-        self._state = getattr(obj, self.variable)
+        self._state = getattr(self._snapshot, self.variable)
 
     @property
     def native_value(self):
@@ -128,20 +173,27 @@ class NestTempSensor(NestSensorDevice, SensorEntity):
         self._unit = TEMP_CELSIUS
 
     def _update_attrs(self):
-        shared = self.shared
-        # Using _ versions to get raw celsius values
-        if self.variable == 'target_temperature' and shared.target_temperature_type == 'range':
-            # low, high = shared.target_temp_range
-            low, high = shared._target_temp_range
-            self._state = f'{low:.1f}-{high:.1f}'
+        super()._update_attrs()
+        snapshot = self._snapshot
+        if self.variable == 'temperature':
+            self._state = snapshot.current_temperature
+        elif snapshot.target_temperature_type == 'range':
+            # There is no single numeric target in range mode; the range is provided via extra_state_attributes
+            self._state = None
         else:
-            temp = shared._target_temperature if self.variable == 'target_temperature' else shared._current_temperature
-            self._state = f'{temp:.1f}'
+            self._state = snapshot.target_temperature
 
     @property
     def native_value(self):
         return self._state
 
+    @property
+    def extra_state_attributes(self):
+        attrs = super().extra_state_attributes
+        if self.variable == 'target_temperature' and self._snapshot.target_temperature_type == 'range':
+            attrs['target_temp_low'], attrs['target_temp_high'] = self._snapshot.target_temp_range
+        return attrs
+
 
 class NestBinarySensor(NestSensorDevice, BinarySensorEntity):
     _types = {
@@ -158,8 +210,8 @@ class NestBinarySensor(NestSensorDevice, BinarySensorEntity):
     _shared_var_attr_map = {'fan': 'hvac_fan_state', 'heat_running': 'hvac_heater_state', 'ac_running': 'hvac_ac_state'}
 
     def _update_attrs(self):
-        obj, attr = self._obj_and_attr
-        value = getattr(obj, attr)
+        super()._update_attrs()
+        value = getattr(self._snapshot, self._attr)
         self._state = not value if self.variable in self._negate else value
 
     @property
@@ -168,10 +220,174 @@ class NestBinarySensor(NestSensorDevice, BinarySensorEntity):
         return self._state
 
     @cached_property
-    def _obj_and_attr(self):
-        if attr := self._structure_var_attr_map.get(self.variable):
-            return self.structure, attr
-        elif attr := self._device_var_attr_map.get(self.variable):
-            return self.device, attr
-        elif attr := self._shared_var_attr_map.get(self.variable):
-            return self.shared, attr
+    def _group(self) -> str:
+        if self.variable in self._structure_var_attr_map:
+            return 'structure'
+        elif self.variable in self._device_var_attr_map:
+            return 'device'
+        return 'shared'
+
+    @cached_property
+    def _attr(self) -> str:
+        for attr_map in (self._structure_var_attr_map, self._device_var_attr_map, self._shared_var_attr_map):
+            if attr := attr_map.get(self.variable):
+                return attr
+
+
+class NestHistorySensor(NestSensorDevice, SensorEntity):
+    """
+    Runtime statistics computed from the locally recorded history of readings for a thermostat.  These are disabled by
+    default since the same statistics are available via the ``nest_web.get_statistics`` service.
+    """
+
+    _attr_entity_registry_enabled_default = False
+
+    # Variable: unit
+    _types = {
+        'heating_duty_cycle': PERCENTAGE,
+        'cooling_duty_cycle': PERCENTAGE,
+        'temperature_rate': f'{TEMP_CELSIUS}/h',
+        'time_to_setpoint': UnitOfTime.SECONDS,
+    }
+
+    def _update_attrs(self):
+        super()._update_attrs()
+        self._unit = self._types[self.variable]
+        if statistics := self.nest_web_dev.history.get_statistics(self.device.serial):
+            self._state = statistics[self.variable]
+
+    @cached_property
+    def device_class(self):
+        return None
+
+    @cached_property
+    def _signal(self) -> str:
+        return history_signal(self.device.serial)
+
+    @property
+    def native_value(self):
+        return self._state
+
+
+class NestScheduleSensor(NestSensorDevice, SensorEntity):
+    """The next setpoint in a thermostat's schedule, and when it will take effect"""
+
+    _types = {'next_setpoint': DEVICE_CLASS_TEMPERATURE, 'next_setpoint_time': SensorDeviceClass.TIMESTAMP}
+
+    def __init__(
+        self, nest_web_dev: NestWebDevice, structure: Structure, device: ThermostatDevice, shared: Shared, variable: str
+    ):
+        self._transition = None
+        super().__init__(nest_web_dev, structure, device, shared, variable)
+        if variable == 'next_setpoint':
+            self._unit = TEMP_CELSIUS
+
+    def _update_attrs(self):
+        super()._update_attrs()
+        self._transition = transition = self.nest_web_dev.schedules.predictions.get(self.device.serial)
+        if transition is None:
+            self._state = None
+        elif self.variable == 'next_setpoint_time':
+            self._state = transition.at
+        else:
+            # There is no single numeric setpoint in range mode; the range is provided via extra_state_attributes
+            self._state = transition.temperature
+
+    @cached_property
+    def _signal(self) -> str:
+        return schedule_signal(self.nest_web_dev.entry_id)
+
+    @property
+    def native_value(self):
+        return self._state
+
+    @property
+    def extra_state_attributes(self):
+        attrs = super().extra_state_attributes
+        if self.variable == 'next_setpoint' and (transition := self._transition) is not None:
+            attrs['mode'] = transition.mode
+            if transition.mode == 'range':
+                attrs['target_temp_low'], attrs['target_temp_high'] = transition.low, transition.high
+        return attrs
+
+
+THERMOSTAT_SENSOR_CLASSES = (NestBasicSensor, NestTempSensor, NestBinarySensor, NestHistorySensor, NestScheduleSensor)
+
+
+class NestRefreshStatSensor(SensorEntity):
+    """Diagnostic refresh instrumentation.  These are disabled by default to avoid unnecessary recorder writes."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_entity_registry_enabled_default = False
+    # Variable: (RefreshStats attribute, unit)
+    _types = {
+        'refresh_duration': ('duration', UnitOfTime.SECONDS),
+        'refresh_lock_wait': ('lock_wait', UnitOfTime.SECONDS),
+        'refresh_bytes_received': ('bytes_received', UnitOfInformation.BYTES),
+        'refresh_objects_changed': ('objects_changed', None),
+        'refresh_skipped_too_soon': ('skipped_too_soon', None),
+        'refresh_failures': ('failures', None),
+    }
+
+    def __init__(self, nest_web_dev: NestWebDevice, entry_id: str, variable: str):
+        self.nest_web_dev = nest_web_dev
+        self.entry_id = entry_id
+        self.variable = variable
+        self._stat, self._unit = self._types[variable]
+        self._name = 'Nest Web {}'.format(variable.replace('_', ' '))
+        self._state = None
+        self._attributes = {}
+        self._update_attrs()
+
+    def _update_attrs(self):
+        value = getattr(self.nest_web_dev.refresh_stats, self._stat)
+        if isinstance(value, RollingHistogram):
+            self._attributes = summary = value.as_dict()
+            self._state = None if (last := summary.get('last')) is None else round(last, 3)
+        else:
+            self._state = value
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def should_poll(self) -> bool:
+        return False
+
+    @cached_property
+    def unique_id(self):
+        return f'{self.entry_id}-{self.variable}'
+
+    @property
+    def device_info(self) -> DeviceInfo:
+        return DeviceInfo(
+            identifiers={(DOMAIN, self.entry_id)},
+            manufacturer='Nest',
+            model='Web Client',
+            name='Nest Web',
+            entry_type=DeviceEntryType.SERVICE,
+        )
+
+    @property
+    def native_unit_of_measurement(self):
+        return self._unit
+
+    @property
+    def native_value(self):
+        return self._state
+
+    @property
+    def extra_state_attributes(self):
+        return self._attributes
+
+    async def async_added_to_hass(self):
+        """Register update signal handler."""
+
+        @callback
+        def async_update_state():
+            """Update sensor state."""
+            self._update_attrs()
+            self.async_write_ha_state()
+
+        self.async_on_remove(async_dispatcher_connect(self.hass, stats_signal(self.entry_id), async_update_state))
@@ -0,0 +1,115 @@
+"""
+Nest Web services
+
+:author: Doug Skrypa
+"""
+
+import logging
+from asyncio import gather
+from datetime import timedelta
+
+import voluptuous as vol
+from homeassistant.components.climate.const import ATTR_FAN_MODE, ATTR_HVAC_MODE, ATTR_PRESET_MODE
+from homeassistant.components.climate.const import ATTR_TARGET_TEMP_HIGH, ATTR_TARGET_TEMP_LOW, PRESET_AWAY, PRESET_NONE
+from homeassistant.const import ATTR_TEMPERATURE
+from homeassistant.core import HomeAssistant, ServiceCall, ServiceResponse, SupportsResponse, callback
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers import config_validation as cv
+
+from .climate import FAN_MODES_HASS_TO_NEST, MODE_HASS_TO_NEST
+from .constants import DOMAIN
+
+__all__ = ['async_register_services', 'async_unregister_services']
+log = logging.getLogger(__name__)
+
+SERVICE_GET_STATISTICS = 'get_statistics'
+SERVICE_SET_STRUCTURE = 'set_structure'
+ATTR_HOURS = 'hours'
+ATTR_SERIAL = 'serial'
+ATTR_STRUCTURE = 'structure'
+
+GET_STATISTICS_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_HOURS, default=24): vol.All(vol.Coerce(float), vol.Range(min=0.1)),
+        vol.Optional(ATTR_SERIAL): vol.All(cv.ensure_list, [cv.string]),
+    }
+)
+SET_STRUCTURE_SCHEMA = vol.All(
+    vol.Schema(
+        {
+            vol.Optional(ATTR_STRUCTURE): vol.All(cv.ensure_list, [cv.string]),
+            vol.Optional(ATTR_SERIAL): vol.All(cv.ensure_list, [cv.string]),
+            vol.Optional(ATTR_TEMPERATURE): vol.Coerce(float),
+            vol.Inclusive(ATTR_TARGET_TEMP_LOW, 'range'): vol.Coerce(float),
+            vol.Inclusive(ATTR_TARGET_TEMP_HIGH, 'range'): vol.Coerce(float),
+            vol.Optional(ATTR_HVAC_MODE): vol.In(MODE_HASS_TO_NEST),
+            vol.Optional(ATTR_FAN_MODE): vol.In(FAN_MODES_HASS_TO_NEST),
+            vol.Optional(ATTR_PRESET_MODE): vol.In([PRESET_NONE, PRESET_AWAY]),
+        }
+    ),
+    cv.has_at_least_one_key(ATTR_TEMPERATURE, ATTR_TARGET_TEMP_LOW, ATTR_HVAC_MODE, ATTR_FAN_MODE, ATTR_PRESET_MODE),
+)
+
+
+@callback
+def async_register_services(hass: HomeAssistant):
+    if hass.services.has_service(DOMAIN, SERVICE_GET_STATISTICS):
+        return
+
+    async def set_structure(call: ServiceCall):
+        """
+        Apply the given changes to all thermostats in the given structures (or with the given serial numbers).  The
+        commands are queued for all thermostats before being sent concurrently, and the follow-up refreshes for each
+        config entry are coalesced into a single refresh.
+        """
+        data = call.data
+        structures, serials = data.get(ATTR_STRUCTURE), data.get(ATTR_SERIAL)
+        devices = {}
+        for nest_web_dev in hass.data[DOMAIN].values():
+            for serial, thermostat in nest_web_dev.thermostats.items():
+                if (not structures or thermostat.structure.name in structures) and (not serials or serial in serials):
+                    devices.setdefault(nest_web_dev, []).append(thermostat)
+
+        if not devices:
+            raise HomeAssistantError(f'No Nest thermostats were found matching {structures=} {serials=}')
+
+        temperatures = {
+            key: data[key] for key in (ATTR_TEMPERATURE, ATTR_TARGET_TEMP_LOW, ATTR_TARGET_TEMP_HIGH) if key in data
+        }
+        for thermostats in devices.values():
+            for thermostat in thermostats:
+                # The mode is applied first, since the type of target temperature that can be set depends on it
+                if (mode := data.get(ATTR_HVAC_MODE)) is not None and mode in thermostat.hvac_modes:
+                    await thermostat.async_set_hvac_mode(mode)
+                if temperatures:
+                    await thermostat.async_set_temperature(**temperatures)
+                if (fan_mode := data.get(ATTR_FAN_MODE)) is not None:
+                    await thermostat.async_set_fan_mode(fan_mode)
+                if (preset_mode := data.get(ATTR_PRESET_MODE)) is not None:
+                    await thermostat.async_set_preset_mode(preset_mode)
+
+        log.info(f'Sending commands for {sum(map(len, devices.values()))} thermostats')
+        await gather(*(nest_web_dev.commands.flush() for nest_web_dev in devices))
+
+    async def get_statistics(call: ServiceCall) -> ServiceResponse:
+        """Runtime statistics for each thermostat, computed from the locally recorded history of readings"""
+        window = timedelta(hours=call.data[ATTR_HOURS])
+        serials = call.data.get(ATTR_SERIAL)
+        response = {}
+        for nest_web_dev in hass.data[DOMAIN].values():
+            for serial, statistics in nest_web_dev.history.statistics(window, serials).items():
+                if snapshot := nest_web_dev.snapshots.get(serial):
+                    statistics['name'] = snapshot.description
+                response[serial] = statistics
+        return response
+
+    hass.services.async_register(DOMAIN, SERVICE_SET_STRUCTURE, set_structure, SET_STRUCTURE_SCHEMA)
+    hass.services.async_register(
+        DOMAIN, SERVICE_GET_STATISTICS, get_statistics, GET_STATISTICS_SCHEMA, supports_response=SupportsResponse.ONLY
+    )
+
+
+@callback
+def async_unregister_services(hass: HomeAssistant):
+    for service in (SERVICE_SET_STRUCTURE, SERVICE_GET_STATISTICS):
+        hass.services.async_remove(DOMAIN, service)
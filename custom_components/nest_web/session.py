@@ -0,0 +1,176 @@
+"""
+Pooled HTTP session management for the Nest web client
+
+:author: Doug Skrypa
+"""
+
+import logging
+import socket
+from functools import lru_cache
+from inspect import signature
+from pathlib import Path
+from typing import Optional
+
+from aiohttp import ClientError, ClientSession, TCPConnector, TraceConfig
+from aiohttp.abc import AbstractResolver
+from aiohttp.resolver import DefaultResolver
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.aiohttp_client import async_create_clientsession
+
+from nest_client.client import NestWebClient
+from nest_client.exceptions import NestException
+
+__all__ = [
+    'ConnectionStats',
+    'EmulatorResolver',
+    'REQUEST_ERRORS',
+    'client_accepts_session',
+    'create_session',
+    'create_client',
+    'default_config_path',
+]
+log = logging.getLogger(__name__)
+
+KEEPALIVE_TIMEOUT = 120
+DNS_CACHE_TTL = 300
+CONNECTION_LIMIT_PER_HOST = 4
+# The client does not wrap connection errors or timeouts from aiohttp, so they need to be handled along with its own
+REQUEST_ERRORS = (NestException, ClientError, OSError, TimeoutError)
+
+
+class ConnectionStats:
+    """Tracks how often requests were able to reuse a pooled connection instead of paying for TCP/TLS setup"""
+
+    def __init__(self):
+        self.supported = True  # False if the client manages its own session, so requests cannot be traced
+        self.requests = 0
+        self.bytes_received = 0
+        self.connections_created = 0
+        self.connections_reused = 0
+        self.dns_cache_hits = 0
+        self.dns_cache_misses = 0
+
+    @property
+    def reuse_ratio(self) -> Optional[float]:
+        if total := self.connections_created + self.connections_reused:
+            return self.connections_reused / total
+        return None
+
+    def as_dict(self) -> dict[str, Optional[float]]:
+        return {
+            'supported': self.supported,
+            'requests': self.requests,
+            'bytes_received': self.bytes_received,
+            'connections_created': self.connections_created,
+            'connections_reused': self.connections_reused,
+            'reuse_ratio': self.reuse_ratio,
+            'dns_cache_hits': self.dns_cache_hits,
+            'dns_cache_misses': self.dns_cache_misses,
+        }
+
+    def trace_config(self) -> TraceConfig:
+        trace_config = TraceConfig()
+        trace_config.on_request_start.append(self._on_request_start)
+        trace_config.on_response_chunk_received.append(self._on_response_chunk_received)
+        trace_config.on_connection_create_end.append(self._on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(self._on_connection_reuseconn)
+        trace_config.on_dns_cache_hit.append(self._on_dns_cache_hit)
+        trace_config.on_dns_cache_miss.append(self._on_dns_cache_miss)
+        return trace_config
+
+    async def _on_request_start(self, session, context, params):
+        self.requests += 1
+
+    async def _on_response_chunk_received(self, session, context, params):
+        self.bytes_received += len(params.chunk)
+
+    async def _on_connection_create_end(self, session, context, params):
+        self.connections_created += 1
+
+    async def _on_connection_reuseconn(self, session, context, params):
+        self.connections_reused += 1
+
+    async def _on_dns_cache_hit(self, session, context, params):
+        self.dns_cache_hits += 1
+
+    async def _on_dns_cache_miss(self, session, context, params):
+        self.dns_cache_misses += 1
+
+
+class EmulatorResolver(AbstractResolver):
+    """
+    Resolves every hostname to the address of a local Nest web emulator (see ``tools/nest_emulator.py``), so the
+    client can be tested end to end without modifying the URLs that it uses.
+    """
+
+    def __init__(self, emulator: str):
+        host, _, port = emulator.rpartition(':')
+        self.host = host or '127.0.0.1'
+        self.port = int(port)
+        self._resolver = DefaultResolver()
+
+    async def resolve(self, host: str, port: int = 0, family: int = socket.AF_INET) -> list[dict]:
+        resolved = await self._resolver.resolve(self.host, self.port, family)
+        return [{**entry, 'hostname': host} for entry in resolved]
+
+    async def close(self):
+        await self._resolver.close()
+
+
+def create_session(
+    hass: HomeAssistant, stats: ConnectionStats, dedicated: bool = False, emulator: str = None
+) -> ClientSession:
+    """
+    :param hass: The Home Assistant instance
+    :param stats: The ConnectionStats that should track requests made with the session
+    :param dedicated: Whether a dedicated connection pool should be used instead of Home Assistant's shared pool
+    :param emulator: The ``host:port`` of a local Nest web emulator that all requests should be sent to, for testing.
+      A dedicated connection pool that does not verify certificates is always used when this is specified.
+    :return: A ClientSession that will keep connections alive between refreshes and commands
+    """
+    trace_configs = [stats.trace_config()]
+    if emulator:
+        log.warning(f'All Nest web requests will be sent to the emulator at {emulator}')
+        connector = TCPConnector(resolver=EmulatorResolver(emulator), ssl=False, use_dns_cache=False)
+        return ClientSession(connector=connector, trace_configs=trace_configs)
+    elif not dedicated:
+        # This uses Home Assistant's shared connector, which is not closed when this session is closed
+        return async_create_clientsession(hass, trace_configs=trace_configs)
+
+    connector = TCPConnector(
+        limit_per_host=CONNECTION_LIMIT_PER_HOST,
+        keepalive_timeout=KEEPALIVE_TIMEOUT,
+        use_dns_cache=True,
+        ttl_dns_cache=DNS_CACHE_TTL,
+        enable_cleanup_closed=True,
+    )
+    return ClientSession(connector=connector, trace_configs=trace_configs)
+
+
+@lru_cache(1)
+def default_config_path() -> Optional[str]:
+    """
+    :return: The path of the nest.cfg file in this integration's config directory, if it exists.  The result is cached,
+      so the filesystem is only checked once, even if the integration is reloaded.  This performs blocking I/O on the
+      first call, so it should be called in an executor.
+    """
+    # Note: importlib.resources.files did not work for this, I assume due to the way HACS installs the integration
+    config_path = Path(__file__).resolve().parent.joinpath('config', 'nest.cfg')
+    return config_path.as_posix() if config_path.is_file() else None
+
+
+def client_accepts_session() -> bool:
+    """:return: True if the installed version of nest-client accepts a shared aiohttp session"""
+    return 'session' in signature(NestWebClient).parameters
+
+
+def create_client(
+    config_path: Optional[str], overrides: Optional[dict], session: Optional[ClientSession]
+) -> NestWebClient:
+    """
+    The client parses its config file when it is initialized, so this should be called in an executor to avoid blocking
+    the event loop.  If no session is provided, then the client manages its own.
+    """
+    if session is None:
+        return NestWebClient(config_path, overrides=overrides)
+    return NestWebClient(config_path, overrides=overrides, session=session)
@@ -0,0 +1,105 @@
+"""
+Immutable per-thermostat snapshots of the values that entities expose
+
+:author: Doug Skrypa
+"""
+
+from typing import Optional
+
+from homeassistant.helpers.entity import DeviceInfo
+
+from nest_client.entities import Structure, ThermostatDevice, Shared
+
+from .constants import DOMAIN
+
+__all__ = ['ThermostatSnapshot']
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(value, 1)
+
+
+class ThermostatSnapshot:
+    """
+    The values read from a thermostat's structure, device, and shared objects, captured once per refresh.  All of the
+    entities for a given thermostat read from the same snapshot instead of reading the underlying objects separately.
+    Temperatures are rounded to the precision that is displayed, so insignificant changes do not produce new states.
+    """
+
+    __slots__ = (
+        'serial',
+        'name',
+        'description',
+        'where',
+        'software_version',
+        'device_info',
+        'has_fan',
+        'away',
+        'humidity',
+        'leaf',
+        'fan_mode',
+        'hvac_state',
+        'hvac_fan_state',
+        'hvac_heater_state',
+        'hvac_ac_state',
+        'can_heat',
+        'can_cool',
+        'target_temperature_type',
+        'current_temperature',
+        'target_temperature',
+        'target_temp_range',
+    )
+
+    def __init__(
+        self,
+        structure: Structure,
+        device: ThermostatDevice,
+        shared: Shared,
+        previous: Optional['ThermostatSnapshot'] = None,
+    ):
+        low, high = shared._target_temp_range  # Using _ versions to get raw celsius values
+        values = {
+            'serial': device.serial,
+            'name': device.name,
+            'description': device.description,
+            'where': device.where,
+            'software_version': device.software_version,
+            'has_fan': device.has['fan'],
+            'away': structure.away,
+            'humidity': device.humidity,
+            'leaf': device.leaf,
+            'fan_mode': device.fan.get('mode'),
+            'hvac_state': shared.hvac_state,
+            'hvac_fan_state': shared.hvac_fan_state,
+            'hvac_heater_state': shared.hvac_heater_state,
+            'hvac_ac_state': shared.hvac_ac_state,
+            'can_heat': shared.can_heat,
+            'can_cool': shared.can_cool,
+            'target_temperature_type': shared.target_temperature_type,
+            'current_temperature': _round(shared._current_temperature),
+            'target_temperature': _round(shared._target_temperature),
+            'target_temp_range': (_round(low), _round(high)),
+        }
+        version = (values['description'], values['software_version'])
+        if previous is not None and (previous.description, previous.software_version) == version:
+            values['device_info'] = previous.device_info
+        else:
+            values['device_info'] = DeviceInfo(
+                identifiers={(DOMAIN, device.serial)},
+                manufacturer='Nest',
+                model='Thermostat',
+                name=device.description,
+                sw_version=device.software_version,
+            )
+
+        for attr, value in values.items():
+            object.__setattr__(self, attr, value)
+
+    def __setattr__(self, key, value):
+        raise AttributeError(f'{self.__class__.__name__} objects are immutable')
+
+    def __delattr__(self, item):
+        raise AttributeError(f'{self.__class__.__name__} objects are immutable')
+
+    def __repr__(self) -> str:
+        return f'<{self.__class__.__name__}[{self.serial}, {self.description!r}]>'
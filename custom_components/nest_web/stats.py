@@ -0,0 +1,114 @@
+"""
+Refresh instrumentation
+
+:author: Doug Skrypa
+"""
+
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from time import monotonic
+from typing import Any, Optional
+
+__all__ = ['RollingHistogram', 'RefreshStats', 'StepTimer']
+
+DEFAULT_WINDOW = 100
+
+
+class RollingHistogram:
+    """Summary statistics for the most recent samples of a single metric"""
+
+    def __init__(self, size: int = DEFAULT_WINDOW):
+        self._samples = deque(maxlen=size)
+        self.total_count = 0
+
+    def add(self, value: float):
+        self._samples.append(value)
+        self.total_count += 1
+
+    @property
+    def last(self) -> Optional[float]:
+        return self._samples[-1] if self._samples else None
+
+    def percentile(self, percent: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+    def as_dict(self) -> dict[str, Optional[float]]:
+        if not (samples := self._samples):
+            return {'count': self.total_count}
+
+        return {
+            'count': self.total_count,
+            'last': samples[-1],
+            'min': min(samples),
+            'mean': sum(samples) / len(samples),
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'max': max(samples),
+        }
+
+
+class RefreshStats:
+    def __init__(self, size: int = DEFAULT_WINDOW):
+        self.duration = RollingHistogram(size)
+        self.lock_wait = RollingHistogram(size)
+        self.bytes_received = RollingHistogram(size)
+        self.objects_refreshed = RollingHistogram(size)
+        self.objects_changed = RollingHistogram(size)
+        self.skipped_too_soon = 0
+        self.skipped_circuit_open = 0
+        self.cancelled = 0
+        self.discarded = 0
+        self.failures = 0
+        self.last_failure: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+
+    def record_failure(self, error: BaseException):
+        self.failures += 1
+        self.last_failure = datetime.now()
+        self.last_error = f'{error.__class__.__name__}: {error}'
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            'duration': self.duration.as_dict(),
+            'lock_wait': self.lock_wait.as_dict(),
+            'bytes_received': self.bytes_received.as_dict(),
+            'objects_refreshed': self.objects_refreshed.as_dict(),
+            'objects_changed': self.objects_changed.as_dict(),
+            'skipped_too_soon': self.skipped_too_soon,
+            'skipped_circuit_open': self.skipped_circuit_open,
+            'cancelled': self.cancelled,
+            'discarded': self.discarded,
+            'failures': self.failures,
+            'last_failure': self.last_failure.isoformat() if self.last_failure else None,
+            'last_error': self.last_error,
+        }
+
+
+class StepTimer:
+    """Durations of each step of a multi-step process, such as setting up a config entry"""
+
+    def __init__(self):
+        self.durations: dict[str, float] = {}
+
+    @contextmanager
+    def step(self, name: str):
+        start = monotonic()
+        try:
+            yield
+        finally:
+            self.durations[name] = monotonic() - start
+
+    @property
+    def total(self) -> float:
+        return sum(self.durations.values())
+
+    def as_dict(self) -> dict[str, float]:
+        durations = {name: round(duration, 3) for name, duration in self.durations.items()}
+        return {**durations, 'total': round(self.total, 3)}
+
+    def __str__(self) -> str:
+        return ', '.join(f'{name}={duration:.3f}s' for name, duration in self.durations.items())
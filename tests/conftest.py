@@ -0,0 +1,22 @@
+"""
+Shared fixtures.  Modules that depend on nest_client are imported inside the fixtures that need them, so tests that do
+not use them can run without it.
+"""
+
+import pytest
+
+
+@pytest.fixture
+async def nest_web_dev(tmp_path):
+    """A NestWebDevice for 3 thermostats backed by the fake Nest web client, initialized but not started"""
+    pytest.importorskip('nest_client.entities')
+    from benchmark import _create_hass
+    from fake_nest import FakeNestWebClient
+    from custom_components.nest_web.device import NestWebDevice
+
+    hass = _create_hass(tmp_path.as_posix())
+    client = FakeNestWebClient(1, 3, change_rate=0)
+    device = NestWebDevice(hass, {'command_delay': 0, 'failure_threshold': 2}, client, 'test')  # noqa
+    assert await device.initialize()
+    yield device
+    device.stop()
@@ -0,0 +1,134 @@
+"""
+Benchmarks for the hot paths of the integration, using pytest-benchmark.  The device benchmarks use the in-process
+fake Nest web client from ``tools/fake_nest.py``, so no Nest account or network access is needed.
+
+Example::
+
+    pytest tests/test_benchmarks.py --benchmark-only --benchmark-group-by=func
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+from custom_components.nest_web.history import HVAC_STATE_CODES, ReadingBuffer, daily_runtime
+from custom_components.nest_web.schedule import ScheduleIndex
+
+NOW = datetime(2026, 10, 14, 12, 0).timestamp()
+
+
+@pytest.fixture(scope='module')
+def full_buffer() -> ReadingBuffer:
+    buffer = ReadingBuffer()
+    for i in range(buffer.capacity + 100):  # Wrapped around, as it would be after a few days
+        hvac = HVAC_STATE_CODES['heating'] if i % 10 < 3 else 0
+        buffer.append(NOW - (buffer.capacity + 100 - i) * 60, 20 + (i % 20) / 10, 21.0, 45.0, hvac)
+    return buffer
+
+
+def test_buffer_append(benchmark):
+    buffer = ReadingBuffer()
+    benchmark(buffer.append, NOW, 20.5, 21.0, 45.0, 1)
+
+
+def test_buffer_statistics(benchmark, full_buffer):
+    stats = benchmark(full_buffer.statistics, timedelta(hours=24), NOW)
+    assert stats['samples'] > 1000
+
+
+def test_buffer_round_trip(benchmark, full_buffer):
+    loaded = benchmark(lambda: ReadingBuffer.from_dict(full_buffer.to_dict(), full_buffer.capacity))
+    assert len(loaded) == len(full_buffer)
+
+
+def test_daily_runtime(benchmark, full_buffer):
+    timestamps, hvac = full_buffer.column('timestamp'), full_buffer.column('hvac')
+    days = benchmark(daily_runtime, timestamps, hvac, timezone.utc)
+    assert days
+
+
+def test_schedule_next_transition(benchmark):
+    index = ScheduleIndex()
+    days = {
+        str(day): {str(i): {'time': i * 10800, 'type': 'HEAT', 'temp': 18.0 + i % 4} for i in range(8)}
+        for day in range(7)
+    }
+    index.update('T1', {'schedule_mode': 'HEAT', 'days': days})
+    assert benchmark(index.next_transition, 'T1', datetime.fromtimestamp(NOW), 'heat') is not None
+
+
+# region Device Benchmarks
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    # Cancel anything left running, such as delayed Store writes, so it is not destroyed while pending
+    if pending := asyncio.all_tasks(loop):
+        for task in pending:
+            task.cancel()
+        loop.run_until_complete(asyncio.wait(pending))
+    loop.close()
+
+
+@pytest.fixture(params=[3, 50], ids=lambda thermostats: f'{thermostats}_thermostats')
+def device_entities(request, loop, tmp_path):
+    pytest.importorskip('nest_client.entities')
+    from benchmark import _create_hass, _create_entities, _count_state_writes
+    from fake_nest import FakeNestWebClient
+    from custom_components.nest_web.device import NestWebDevice
+
+    async def setup():
+        hass = _create_hass(tmp_path.as_posix())
+        client = FakeNestWebClient(1, request.param, change_rate=0.1)
+        nest_web_dev = NestWebDevice(hass, {'command_delay': 0}, client, 'benchmark')  # noqa
+        await nest_web_dev.initialize()
+        entities = _create_entities(hass, nest_web_dev)
+        for entity in entities:
+            await entity.async_added_to_hass()
+        _count_state_writes(entities)
+        return nest_web_dev, entities
+
+    nest_web_dev, entities = loop.run_until_complete(setup())
+    yield nest_web_dev, entities
+    nest_web_dev.stop()
+
+
+def test_refresh(benchmark, loop, device_entities):
+    from custom_components.nest_web.device import MIN_REFRESH_INTERVAL
+
+    nest_web_dev, _ = device_entities
+
+    def refresh():
+        nest_web_dev.last_refresh = datetime.now() - MIN_REFRESH_INTERVAL  # Avoid the too-soon check
+        loop.run_until_complete(nest_web_dev.refresh())
+
+    benchmark(refresh)
+    assert nest_web_dev.refresh_stats.failures == 0
+
+
+def test_entity_update(benchmark, device_entities):
+    _, entities = device_entities
+
+    def update_all():
+        for entity in entities:
+            entity._update_attrs()
+
+    benchmark(update_all)
+
+
+def test_set_temperature(benchmark, loop, device_entities):
+    from custom_components.nest_web.climate import NestThermostat
+
+    nest_web_dev, entities = device_entities
+    thermostat = next(entity for entity in entities if isinstance(entity, NestThermostat))
+    benchmark(lambda: loop.run_until_complete(thermostat.async_set_temperature(temperature=20)))
+    loop.run_until_complete(nest_web_dev.commands.flush())
+    assert nest_web_dev.commands.sent >= 1
+
+
+# endregion
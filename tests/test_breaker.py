@@ -0,0 +1,65 @@
+"""
+Tests for the circuit breaker and jittered backoff
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from custom_components.nest_web.breaker import CircuitBreaker, jittered_backoff
+
+
+@pytest.mark.parametrize('attempt, low, high', [(1, 5, 10), (2, 10, 20), (3, 20, 40), (10, 30, 60)])
+def test_jittered_backoff_range(attempt, low, high):
+    for _ in range(50):
+        assert low <= jittered_backoff(attempt, 10, 60) <= high
+
+
+def test_trips_at_threshold():
+    breaker = CircuitBreaker(threshold=3)
+    for _ in range(2):
+        breaker.record_failure()
+        assert not breaker.tripped
+        assert not breaker.is_open
+        assert breaker.retry_at is None
+
+    breaker.record_failure()
+    assert breaker.tripped
+    assert breaker.is_open
+    assert breaker.trips == 1
+    assert timedelta() < breaker.retry_delay <= timedelta(seconds=breaker.base_delay)
+
+
+def test_failures_while_tripped_back_off_further():
+    breaker = CircuitBreaker(threshold=1, base_delay=10, max_delay=1000)
+    breaker.record_failure()
+    first_retry = breaker.retry_at
+    for _ in range(4):
+        breaker.record_failure()
+    assert breaker.trips == 1  # Still the same trip
+    # The 5th attempt's delay is at least 80s, while the first was at most 10s
+    assert breaker.retry_at - first_retry > timedelta(seconds=60)
+
+
+def test_retry_after_delay():
+    breaker = CircuitBreaker(threshold=1)
+    breaker.record_failure()
+    breaker.retry_at = datetime.now() - timedelta(seconds=1)
+    assert not breaker.is_open  # A trial request is allowed
+    assert breaker.tripped
+    assert breaker.retry_delay == timedelta()
+
+
+def test_success_resets():
+    breaker = CircuitBreaker(threshold=2)
+    for _ in range(3):
+        breaker.record_failure()
+    breaker.record_success()
+    assert not breaker.tripped
+    assert not breaker.is_open
+    assert breaker.consecutive_failures == 0
+    assert breaker.retry_delay is None
+
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.trips == 2
@@ -0,0 +1,137 @@
+"""
+Tests for the debouncing command queue
+"""
+
+import pytest
+from aiohttp import ClientConnectionError
+
+pytest.importorskip('nest_client.exceptions')
+
+from nest_client.exceptions import NestException
+
+from custom_components.nest_web import commands
+from custom_components.nest_web.commands import CommandQueue
+
+
+class ScheduledFlushes:
+    """Replaces async_call_later, so flushes only happen when a test triggers them"""
+
+    def __init__(self):
+        self.scheduled = []
+        self.cancelled = 0
+
+    def __call__(self, hass, delay, action):
+        self.scheduled.append(action)
+
+        def cancel():
+            self.cancelled += 1
+
+        return cancel
+
+
+@pytest.fixture
+def flushes(monkeypatch):
+    monkeypatch.setattr(commands, 'async_call_later', flushes := ScheduledFlushes())
+    return flushes
+
+
+class Recorder:
+    def __init__(self):
+        self.calls = []
+        self.sent = []
+        self.pending = []
+
+    def command(self, name: str, error: Exception = None):
+        async def command():
+            self.calls.append(name)
+            if error is not None:
+                raise error
+
+        return command
+
+
+def _queue(recorder: Recorder) -> CommandQueue:
+    return CommandQueue(None, 0.5, recorder.sent.append, recorder.pending.append)  # noqa
+
+
+async def test_only_the_latest_command_per_setting_is_sent(flushes):
+    recorder = Recorder()
+    queue = _queue(recorder)
+    for temp in (18, 19, 20):
+        queue.submit('T1', 'temperature', recorder.command(f'temp={temp}'))
+    queue.submit('T1', 'mode', recorder.command('mode=heat'))
+    assert queue.pending == 2
+    assert len(flushes.scheduled) == 4
+    assert flushes.cancelled == 3  # Each submission restarts the delay
+
+    await queue.flush()
+    assert recorder.calls == ['temp=20', 'mode=heat']
+    assert recorder.sent == ['T1']
+    assert (queue.submitted, queue.sent, queue.failed, queue.pending) == (4, 2, 0, 0)
+
+
+async def test_commands_are_sent_in_the_order_last_submitted(flushes):
+    recorder = Recorder()
+    queue = _queue(recorder)
+    queue.submit('T1', 'temperature', recorder.command('temp=18'))
+    queue.submit('T1', 'mode', recorder.command('mode=heat'))
+    queue.submit('T1', 'temperature', recorder.command('temp=19'))
+    await queue.flush()
+    assert recorder.calls == ['mode=heat', 'temp=19']
+
+
+async def test_shared_targets_are_not_merged_with_thermostat_settings(flushes):
+    recorder = Recorder()
+    queue = _queue(recorder)
+    queue.submit('T1', 'away', recorder.command('T1 away'))
+    queue.submit('T1', 'away', recorder.command('structure away'), target='S1')
+    queue.submit('T2', 'away', recorder.command('structure away 2'), target='S1')
+    await queue.flush()
+    assert sorted(recorder.calls) == ['T1 away', 'structure away 2']
+    assert sorted(recorder.sent) == ['T1', 'T2']
+
+
+async def test_scheduled_flush_and_pending_callbacks(flushes):
+    recorder = Recorder()
+    queue = _queue(recorder)
+    queue.submit('T1', 'temperature', recorder.command('temp=18'))
+    assert recorder.pending == ['T1']
+
+    await flushes.scheduled[-1](None)
+    assert recorder.calls == ['temp=18']
+    assert recorder.pending == ['T1', 'T1', 'T1']  # Again right before it was sent, and after it was sent
+    await queue.flush()  # Nothing is pending
+    assert queue.sent == 1
+
+
+async def test_failures_are_counted_and_do_not_stop_other_commands(flushes):
+    recorder = Recorder()
+    queue = _queue(recorder)
+    queue.submit('T1', 'temperature', recorder.command('temp=18', NestException('temp=18 failed')))
+    queue.submit('T1', 'mode', recorder.command('mode=heat'))
+    queue.submit('T2', 'mode', recorder.command('T2 mode=cool'))
+    await queue.flush()
+    assert sorted(recorder.calls) == ['T2 mode=cool', 'mode=heat', 'temp=18']
+    assert (queue.sent, queue.failed) == (3, 1)
+    assert sorted(recorder.sent) == ['T1', 'T2']
+
+
+async def test_network_errors_are_counted_as_failures(flushes):
+    recorder = Recorder()
+    queue = _queue(recorder)
+    queue.submit('T1', 'temperature', recorder.command('temp=18', ClientConnectionError('Connection refused')))
+    queue.submit('T1', 'mode', recorder.command('mode=heat'))
+    await queue.flush()
+    assert recorder.calls == ['temp=18', 'mode=heat']
+    assert (queue.sent, queue.failed) == (2, 1)
+    assert recorder.sent == ['T1']
+
+
+async def test_sent_callback_runs_after_unexpected_errors(flushes):
+    recorder = Recorder()
+    queue = _queue(recorder)
+    queue.submit('T1', 'temperature', recorder.command('temp=18', RuntimeError('unexpected')))
+    with pytest.raises(RuntimeError):
+        await queue.flush()
+    assert recorder.sent == ['T1']  # The follow-up refresh is still requested
+    assert queue.pending == 0
@@ -0,0 +1,253 @@
+"""
+Tests for NestWebDevice, driven by the fake Nest web client
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from aiohttp import ClientConnectionError
+from homeassistant.core import callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+
+pytest.importorskip('nest_client.entities')
+
+from custom_components.nest_web.device import MIN_REFRESH_INTERVAL, update_signal
+
+ALL_GROUPS = frozenset(('structure', 'device', 'shared'))
+
+
+def _allow_refresh(nest_web_dev):
+    nest_web_dev.last_refresh = datetime.now() - MIN_REFRESH_INTERVAL
+
+
+def _capture_updates(nest_web_dev) -> list[tuple[str, frozenset[str]]]:
+    """:return: A list that the (serial, changed groups) from each update signal will be appended to"""
+    updates = []
+    for serial in nest_web_dev.groups_by_serial:
+
+        @callback
+        def handle_update(groups: frozenset[str], serial: str = serial):
+            updates.append((serial, groups))
+
+        async_dispatcher_connect(nest_web_dev.hass, update_signal(serial), handle_update)
+    return updates
+
+
+# region Change Detection
+
+
+async def test_only_changed_thermostats_are_dispatched(nest_web_dev):
+    updates = _capture_updates(nest_web_dev)
+    unchanged = nest_web_dev.snapshots['T00000000']
+    _, _, shared = nest_web_dev.groups_by_serial['T00000001']
+    await shared._command(_current_temperature=22.5)
+
+    _allow_refresh(nest_web_dev)
+    await nest_web_dev.refresh()
+    assert updates == [('T00000001', frozenset({'shared'}))]
+    assert nest_web_dev.snapshots['T00000001'].current_temperature == 22.5
+    assert nest_web_dev.snapshots['T00000000'] is unchanged  # Snapshots are only rebuilt for changed thermostats
+
+    updates.clear()
+    _allow_refresh(nest_web_dev)
+    await nest_web_dev.refresh()
+    assert not updates
+
+
+async def test_commanded_thermostats_are_dispatched_without_changes(nest_web_dev):
+    updates = _capture_updates(nest_web_dev)
+    nest_web_dev.register_command('T00000002')
+    await nest_web_dev.refresh(['T00000002'])
+    assert updates == [('T00000002', ALL_GROUPS)]  # Optimistic state is replaced with the confirmed values
+
+
+# endregion
+
+
+# region Failures
+
+
+async def _connection_refused(*args, **kwargs):
+    raise ClientConnectionError('Connection refused')
+
+
+async def test_network_errors_trip_the_breaker(nest_web_dev, monkeypatch):
+    monkeypatch.setattr(nest_web_dev.nest, 'refresh_objects', _connection_refused)
+    for _ in range(2):
+        _allow_refresh(nest_web_dev)
+        with pytest.raises(ClientConnectionError):
+            await nest_web_dev.refresh()
+
+    assert nest_web_dev.breaker.tripped
+    assert nest_web_dev.stale
+    assert nest_web_dev.available  # Stale values are still served until they are older than max_stale_age
+    assert nest_web_dev.refresh_stats.failures == 2
+    assert nest_web_dev.refresh_stats.last_error == 'ClientConnectionError: Connection refused'
+
+    await nest_web_dev.refresh()  # Skipped while the breaker is open
+    assert nest_web_dev.refresh_stats.skipped_circuit_open == 1
+    retry_delay = nest_web_dev.breaker.retry_delay.total_seconds()
+    assert nest_web_dev._next_refresh_interval().total_seconds() == pytest.approx(retry_delay, abs=1)
+
+
+async def test_recovery_resets_the_breaker_and_updates_every_thermostat(nest_web_dev, monkeypatch):
+    with monkeypatch.context() as patch:
+        patch.setattr(nest_web_dev.nest, 'refresh_objects', _connection_refused)
+        for _ in range(2):
+            _allow_refresh(nest_web_dev)
+            with pytest.raises(ClientConnectionError):
+                await nest_web_dev.refresh()
+
+    updates = _capture_updates(nest_web_dev)
+    nest_web_dev.breaker.retry_at = datetime.now() - timedelta(seconds=1)
+    await nest_web_dev.refresh()  # The trial request succeeds
+    assert not nest_web_dev.breaker.tripped
+    assert not nest_web_dev.stale
+    # Every thermostat is updated so entities are no longer reported as stale, even though nothing changed
+    assert sorted(updates) == [(serial, ALL_GROUPS) for serial in sorted(nest_web_dev.groups_by_serial)]
+
+
+async def test_scheduled_refresh_handles_network_errors(nest_web_dev, monkeypatch):
+    monkeypatch.setattr(nest_web_dev.nest, 'refresh_objects', _connection_refused)
+    _allow_refresh(nest_web_dev)
+    await nest_web_dev._handle_scheduled_refresh(datetime.now())
+    assert nest_web_dev.refresh_stats.failures == 1
+    assert nest_web_dev._cancel_scheduled_refresh is not None  # The next refresh was still scheduled
+
+
+async def test_reconcile_handles_network_errors(nest_web_dev, monkeypatch):
+    async def timeout():
+        raise TimeoutError
+
+    monkeypatch.setattr(nest_web_dev.nest, 'get_init_objects', timeout)
+    nest_web_dev.live = False
+    await nest_web_dev._handle_scheduled_refresh(datetime.now())
+    assert nest_web_dev.breaker.consecutive_failures == 1
+    assert nest_web_dev.stale
+
+
+async def test_aclose_tears_down_after_command_errors(nest_web_dev):
+    async def command():
+        raise RuntimeError('unexpected')
+
+    nest_web_dev.start()
+    nest_web_dev.commands.submit('T00000000', 'temperature', command)
+    await nest_web_dev.aclose()
+    assert nest_web_dev._cancel_scheduled_refresh is None
+    assert nest_web_dev._cancel_command_refresh is None
+    assert nest_web_dev.commands.pending == 0
+
+
+# endregion
+
+
+# region Object Cache
+
+
+async def test_refreshed_objects_are_cached_at_the_next_interval(nest_web_dev):
+    from custom_components.nest_web.cache import ObjectCache
+
+    cache = nest_web_dev.cache
+    for _ in range(3):
+        _allow_refresh(nest_web_dev)
+        await nest_web_dev.refresh()
+    assert cache._pending is not None  # Only the latest refresh is waiting to be written
+
+    await cache._handle_save(datetime.now())
+    assert cache._pending is None
+    data = await ObjectCache(nest_web_dev.hass, 'test')._store.async_load()
+    assert data['refreshed'] == nest_web_dev.last_refresh.isoformat()
+    assert len(data['groups']) == 3
+
+
+# endregion
+
+
+# region Commands
+
+
+async def test_refreshes_started_while_a_command_is_sent_are_discarded(nest_web_dev):
+    seqs = []
+
+    async def command():
+        seqs.append(nest_web_dev._command_seq)  # The sequence number that a refresh started now would use
+
+    nest_web_dev.commands.submit('T00000000', 'temperature', command)
+    await nest_web_dev.commands.flush()
+    assert nest_web_dev._commanded_since(seqs[0]) == {'T00000000'}
+
+
+async def test_refresh_results_are_discarded_for_thermostats_commanded_during_the_refresh(nest_web_dev, monkeypatch):
+    updates = _capture_updates(nest_web_dev)
+    _, _, shared = nest_web_dev.groups_by_serial['T00000000']
+    before = nest_web_dev.snapshots['T00000000']
+    refresh_objects = nest_web_dev.nest.refresh_objects
+
+    async def refresh_during_command(*args, **kwargs):
+        await shared._command(_current_temperature=18.0)  # The previous value, returned before the command completed
+        nest_web_dev.invalidate('T00000000')
+        await refresh_objects(*args, **kwargs)
+
+    with monkeypatch.context() as patch:
+        patch.setattr(nest_web_dev.nest, 'refresh_objects', refresh_during_command)
+        _allow_refresh(nest_web_dev)
+        await nest_web_dev.refresh()
+
+    assert not updates
+    assert nest_web_dev.snapshots['T00000000'] is before
+    assert nest_web_dev.refresh_stats.discarded == 1
+
+    _allow_refresh(nest_web_dev)
+    await nest_web_dev.refresh()  # Requested after the command, so it is applied
+    assert updates == [('T00000000', frozenset({'shared'}))]
+    assert nest_web_dev.snapshots['T00000000'].current_temperature == 18.0
+
+
+async def test_in_flight_refreshes_are_cancelled_when_every_thermostat_was_commanded(nest_web_dev, monkeypatch):
+    async def refresh_during_command(*args, **kwargs):
+        nest_web_dev.invalidate('T00000000')
+        await asyncio.sleep(0)
+
+    monkeypatch.setattr(nest_web_dev.nest, 'refresh_objects', refresh_during_command)
+    _allow_refresh(nest_web_dev)
+    await nest_web_dev.refresh(['T00000000'])
+    assert nest_web_dev.refresh_stats.cancelled == 1
+    assert nest_web_dev._in_flight is None
+
+
+# endregion
+
+
+# region Refresh Interval
+
+
+def _set_hvac_state(nest_web_dev, state: str):
+    for _, _, shared in nest_web_dev.struct_thermostat_groups:
+        shared.hvac_state = state
+
+
+async def test_idle_refreshes_back_off_to_the_max_interval(nest_web_dev):
+    _set_hvac_state(nest_web_dev, 'off')
+    intervals = [nest_web_dev._next_refresh_interval().total_seconds() for _ in range(5)]
+    assert intervals == [180, 360, 720, 900, 900]
+
+    nest_web_dev.struct_thermostat_groups[0][2].hvac_state = 'heating'
+    assert nest_web_dev._next_refresh_interval() == timedelta(seconds=60)
+
+    _set_hvac_state(nest_web_dev, 'off')  # The backoff starts over after activity
+    assert nest_web_dev._next_refresh_interval() == timedelta(seconds=180)
+
+
+async def test_recent_commands_use_the_min_interval(nest_web_dev):
+    _set_hvac_state(nest_web_dev, 'off')
+    for _ in range(3):
+        nest_web_dev._next_refresh_interval()
+
+    nest_web_dev.last_command = datetime.now()
+    assert nest_web_dev._next_refresh_interval() == MIN_REFRESH_INTERVAL
+    nest_web_dev.last_command = datetime.min
+    assert nest_web_dev._next_refresh_interval() == timedelta(seconds=180)
+
+
+# endregion
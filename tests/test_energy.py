@@ -0,0 +1,26 @@
+"""
+Tests for the runtime statistics importer
+"""
+
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+from custom_components.nest_web.energy import _hour_start
+
+
+@pytest.mark.parametrize(
+    'offset, expected',
+    [
+        (timedelta(), datetime(2026, 10, 12, 0)),
+        (timedelta(hours=-5), datetime(2026, 10, 12, 5)),
+        (timedelta(hours=5, minutes=30), datetime(2026, 10, 11, 19)),  # Local midnight is 18:30 UTC
+        (timedelta(hours=-3, minutes=-30), datetime(2026, 10, 12, 4)),  # Local midnight is 03:30 UTC
+        (timedelta(hours=5, minutes=45), datetime(2026, 10, 11, 19)),  # Local midnight is 18:15 UTC
+    ],
+)
+def test_hour_start_is_on_the_same_local_day(offset, expected):
+    tz = timezone(offset)
+    start = _hour_start(date(2026, 10, 12), tz)
+    assert start == expected.replace(tzinfo=timezone.utc)
+    assert start.astimezone(tz).date() == date(2026, 10, 12)
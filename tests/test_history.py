@@ -0,0 +1,126 @@
+"""
+Tests for the reading ring buffer and the statistics computed from it
+"""
+
+from array import array
+from datetime import date, datetime, timedelta, timezone
+from math import isnan
+from types import SimpleNamespace
+
+import pytest
+from homeassistant.core import HomeAssistant
+
+from custom_components.nest_web.history import HVAC_STATE_CODES, ReadingBuffer, ReadingHistory, daily_runtime
+
+HEAT, COOL = HVAC_STATE_CODES['heating'], HVAC_STATE_CODES['cooling']
+
+
+def _fill(buffer: ReadingBuffer, count: int, start: float = 0, step: float = 60):
+    for i in range(count):
+        buffer.append(start + i * step, 20 + i / 10, 21.0, None if i % 2 else 45.0, HEAT if i % 3 == 0 else 0)
+
+
+def test_append_before_full():
+    buffer = ReadingBuffer(5)
+    assert buffer.last('timestamp') is None
+    _fill(buffer, 3)
+    assert len(buffer) == 3
+    assert list(buffer.column('timestamp')) == [0, 60, 120]
+    assert buffer.last('timestamp') == 120
+    assert isnan(buffer.column('humidity')[1])  # None is stored as nan
+
+
+def test_wraparound_keeps_newest_in_order():
+    buffer = ReadingBuffer(5)
+    _fill(buffer, 12)
+    assert len(buffer) == 5
+    assert list(buffer.column('timestamp')) == [i * 60 for i in range(7, 12)]
+    assert list(buffer.column('hvac')) == [0, 0, HEAT, 0, 0]
+    assert buffer.last('timestamp') == 660
+
+
+def test_round_trip():
+    buffer = ReadingBuffer(5)
+    _fill(buffer, 7)
+    loaded = ReadingBuffer.from_dict(buffer.to_dict(), 5)
+    assert len(loaded) == 5
+    for name in ('timestamp', 'temperature', 'target', 'hvac'):
+        assert loaded.column(name) == buffer.column(name)
+    assert [isnan(val) for val in loaded.column('humidity')] == [isnan(val) for val in buffer.column('humidity')]
+
+    loaded.append(1000, 22.0, 21.0, 40.0, COOL)  # The loaded buffer continues from where the saved one left off
+    assert list(loaded.column('timestamp')) == [180, 240, 300, 360, 1000]
+
+
+def test_from_dict_with_smaller_capacity_keeps_newest():
+    buffer = ReadingBuffer(10)
+    _fill(buffer, 8)
+    loaded = ReadingBuffer.from_dict(buffer.to_dict(), 3)
+    assert list(loaded.column('timestamp')) == [300, 360, 420]
+    loaded.append(1000, 22.0, 21.0, 40.0, COOL)
+    assert list(loaded.column('timestamp')) == [360, 420, 1000]
+
+
+def test_from_dict_inconsistent_lengths():
+    buffer = ReadingBuffer(5)
+    _fill(buffer, 3)
+    data = buffer.to_dict()
+    data['hvac'] = ReadingBuffer(5).to_dict()['hvac']
+    with pytest.raises(ValueError):
+        ReadingBuffer.from_dict(data, 5)
+
+
+def test_statistics():
+    buffer = ReadingBuffer(100)
+    now = 10_000
+    for i in range(10):
+        buffer.append(now - 600 + i * 60, 20.0 + i * 0.1, 21.0, 45.0, HEAT if 1 <= i <= 5 else 0)
+    stats = buffer.statistics(timedelta(hours=1), now)
+    assert stats['samples'] == 10
+    assert stats['heating_duty_cycle'] == pytest.approx(100 * 5 / 9, abs=0.1)
+    assert stats['cooling_duty_cycle'] == 0
+    assert stats['temperature_min'] == 20.0
+    assert stats['temperature_max'] == pytest.approx(20.9)
+    assert stats['time_to_setpoint'] == 300
+
+
+def test_daily_runtime_splits_days_and_skips_gaps():
+    tz = timezone(timedelta(hours=5, minutes=30))
+    start = datetime(2026, 10, 12, 23, 0, tzinfo=tz).timestamp()
+    timestamps = array('d', [start + i * 600 for i in range(13)])  # 23:00 to 01:00, every 10 minutes
+    hvac = array('b', [HEAT] * 6 + [COOL] * 7)
+    timestamps.append(timestamps[-1] + 7200)  # A gap longer than MAX_SAMPLE_GAP is not counted
+    hvac.append(0)
+
+    days = daily_runtime(timestamps, hvac, tz)
+    assert days == {date(2026, 10, 12): (3600.0, 0.0), date(2026, 10, 13): (0.0, 3600.0)}
+
+
+def test_daily_runtime_empty():
+    assert daily_runtime(array('d'), array('b'), timezone.utc) == {}
+
+
+async def test_history_is_saved_periodically(tmp_path, monkeypatch):
+    hass = HomeAssistant(tmp_path.as_posix())
+    history = ReadingHistory(hass, 'test', 10)
+    saves = []
+    original_save = history._store.async_save
+
+    async def async_save(data):
+        saves.append(data)
+        await original_save(data)
+
+    monkeypatch.setattr(history._store, 'async_save', async_save)
+    snapshot = SimpleNamespace(
+        serial='T1', hvac_state='heating', current_temperature=20.0, target_temperature=21.0, humidity=45.0
+    )
+    assert history.record([snapshot]) == ['T1']
+    assert not saves  # Readings are not saved until the next interval
+
+    await history._handle_save(datetime.now())
+    await history._handle_save(datetime.now())
+    assert len(saves) == 1  # Nothing new was recorded before the second interval
+
+    loaded = ReadingHistory(hass, 'test', 10)
+    await loaded.async_load()
+    assert list(loaded.buffers['T1'].column('hvac')) == [HEAT]
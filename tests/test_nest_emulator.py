@@ -0,0 +1,69 @@
+"""
+Tests for the redaction of recorded request / response bodies in the Nest web service emulator
+"""
+
+import json
+
+import pytest
+
+from nest_emulator import FORM_CONTENT_TYPE, REDACTED, _decode, _redact
+
+
+def test_decode_json():
+    assert _decode(b'{"a": 1, "b": [true, null]}', 'application/json') == {'a': 1, 'b': [True, None]}
+    assert _decode(b'[1, 2]') == [1, 2]  # The content type is not required for JSON
+
+
+def test_decode_form():
+    data = b'grant_type=refresh_token&refresh_token=abc%2F123&scope='
+    expected = {'grant_type': 'refresh_token', 'refresh_token': 'abc/123', 'scope': ''}
+    assert _decode(data, FORM_CONTENT_TYPE) == expected
+
+
+@pytest.mark.parametrize('data, expected', [(b'', None), (b'not json', 'not json'), (b'\xff{', '\ufffd{')])
+def test_decode_unparseable_or_empty(data, expected):
+    assert _decode(data, 'text/plain') == expected
+
+
+@pytest.mark.parametrize(
+    'key', ['access_token', 'sessionToken', 'X-Nest-JWT', 'jwt', 'Set-Cookie', 'userEmail', 'Authorization', 'PASSWORD']
+)
+def test_sensitive_key_variants_are_redacted(key):
+    assert _redact({key: 'value', 'other': 'value'}) == {key: REDACTED, 'other': 'value'}
+
+
+def test_nested_values_are_redacted():
+    data = {
+        'user': {'email': 'user@example.com', 'name': 'User'},
+        'tokens': ['a', 'b'],
+        'items': [{'id_token': 'c', 'id': 1}],
+        'empty_token': '',
+    }
+    expected = {
+        'user': {'email': REDACTED, 'name': 'User'},
+        'tokens': [REDACTED, REDACTED],
+        'items': [{'id_token': REDACTED, 'id': 1}],
+        'empty_token': '',  # Empty values are kept, since they do not reveal anything
+    }
+    assert _redact(data) == expected
+
+
+def test_json_body_is_redacted():
+    body = json.dumps({'access_token': 'secret', 'expires_in': 3600, 'userid': '1000001'}).encode()
+    redacted = _redact(_decode(body, 'application/json'))
+    assert redacted == {'access_token': REDACTED, 'expires_in': 3600, 'userid': '1000001'}
+
+
+def test_form_body_is_redacted():
+    body = b'refresh_token=secret&client_id=abc&login_hint=user%40example.com'
+    redacted = _redact(_decode(body, FORM_CONTENT_TYPE))
+    assert redacted == {'refresh_token': REDACTED, 'client_id': 'abc', 'login_hint': REDACTED}
+
+
+@pytest.mark.parametrize('body', [b'token=secret;', b'Set-Cookie: SID=secret', b'<html>user@example.com password'])
+def test_unparseable_bodies_with_sensitive_values_are_omitted(body):
+    assert _redact(_decode(body, 'text/html')) == REDACTED
+
+
+def test_unparseable_bodies_without_sensitive_values_are_kept():
+    assert _redact(_decode(b'<html>OK</html>', 'text/html')) == '<html>OK</html>'
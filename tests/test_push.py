@@ -0,0 +1,126 @@
+"""
+Tests for the long-poll push listener, using a local stub subscribe server.
+"""
+
+import asyncio
+
+import pytest
+from aiohttp import ClientSession, web
+from aiohttp.test_utils import TestServer
+
+pytest.importorskip('nest_client.exceptions')
+
+from custom_components.nest_web import push
+from custom_components.nest_web.push import PushListener
+
+
+class StubHass:
+    """Provides the only HomeAssistant method that PushListener uses"""
+
+    def async_create_background_task(self, target, name):
+        return asyncio.create_task(target, name=name)
+
+
+class StubSubscribeServer:
+    """A subscribe endpoint that holds requests open until released, returns immediately, or drops the connection"""
+
+    def __init__(self, mode: str = 'hold'):
+        self.mode = mode
+        self.requests = 0
+        self.release = asyncio.Event()
+
+    async def subscribe(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        if self.mode == 'disconnect':
+            request.transport.close()
+        elif self.mode == 'hold':
+            await self.release.wait()
+            self.release.clear()
+        return web.json_response({'objects': []})
+
+
+@pytest.fixture
+def fast_timing(monkeypatch):
+    monkeypatch.setattr(push, 'MIN_SUBSCRIBE_DURATION', 0.05)
+    monkeypatch.setattr(push, 'MAX_SHORT_RESPONSES', 2)
+    monkeypatch.setattr(push, 'MIN_RECONNECT_DELAY', 0.01)
+    monkeypatch.setattr(push, 'MAX_RECONNECT_DELAY', 0.02)
+    monkeypatch.setattr(push, 'SHORT_RESPONSE_COOLDOWN', 0.1)
+
+
+async def _start(mode: str):
+    stub = StubSubscribeServer(mode)
+    app = web.Application()
+    app.router.add_post('/v6/subscribe', stub.subscribe)
+    server = TestServer(app)
+    await server.start_server()
+    session = ClientSession()
+
+    async def subscribe():
+        async with session.post(server.make_url('/v6/subscribe'), json={'objects': []}) as resp:
+            await resp.json()
+
+    updates = []
+    listener = PushListener(StubHass(), subscribe, lambda: updates.append(1))  # noqa
+    listener.start()
+
+    async def cleanup():
+        listener.stop()
+        await session.close()
+        await server.close()
+
+    return stub, listener, updates, cleanup
+
+
+async def _wait_for(condition, timeout: float = 2.0):
+    async with asyncio.timeout(timeout):
+        while not condition():
+            await asyncio.sleep(0.01)
+
+
+async def test_held_subscribe_delivers_updates(fast_timing):
+    stub, listener, updates, cleanup = await _start('hold')
+    try:
+        await _wait_for(lambda: stub.requests == 1)
+        assert listener.connected
+        await asyncio.sleep(0.06)  # Longer than MIN_SUBSCRIBE_DURATION, so it is not considered a short response
+        stub.release.set()
+        await _wait_for(lambda: updates)
+        assert listener.updates == 1
+        await _wait_for(lambda: stub.requests == 2)
+        assert listener.connected
+    finally:
+        await cleanup()
+    assert not listener.connected
+
+
+async def test_dropped_connections_are_retried(fast_timing):
+    stub, listener, updates, cleanup = await _start('disconnect')
+    try:
+        await _wait_for(lambda: listener.failures >= 3)
+        assert listener.running
+        assert not updates
+    finally:
+        await cleanup()
+
+
+async def test_short_responses_resume_after_cooldown(fast_timing):
+    stub, listener, updates, cleanup = await _start('immediate')
+    try:
+        await _wait_for(lambda: stub.requests == 2)
+        await _wait_for(lambda: not listener.connected)
+        await _wait_for(lambda: stub.requests > 2)  # Retried after SHORT_RESPONSE_COOLDOWN instead of stopping
+        assert listener.running
+    finally:
+        await cleanup()
+
+
+async def test_unexpected_error_resets_connected():
+    async def subscribe():
+        raise RuntimeError('unexpected')
+
+    listener = PushListener(StubHass(), subscribe, lambda: None)  # noqa
+    listener.start()
+    with pytest.raises(RuntimeError):
+        await listener._task
+    assert not listener.connected
@@ -0,0 +1,85 @@
+"""
+Tests for the schedule transition index
+"""
+
+from datetime import datetime
+
+from custom_components.nest_web.schedule import ScheduleIndex, Transition
+
+MONDAY = datetime(2026, 10, 12)  # Schedule days start on Monday (day 0)
+
+
+def _entry(time: int, temp: float = None, entry_type: str = 'setpoint', mode: str = 'HEAT', **kwargs):
+    return {'time': time, 'type': mode, 'temp': temp, 'entry_type': entry_type, **kwargs}
+
+
+def _schedule(mode: str = 'HEAT'):
+    return {
+        'schedule_mode': mode,
+        'days': {
+            '0': {'0': _entry(0, 17.0, 'continuation'), '1': _entry(6 * 3600, 20.0), '2': _entry(22 * 3600, 17.0)},
+            '4': {'0': _entry(7 * 3600, 21.0)},
+        },
+    }
+
+
+def test_next_transition_same_day():
+    index = ScheduleIndex()
+    index.update('T1', _schedule())
+    assert 'T1' in index
+    transition = index.next_transition('T1', MONDAY.replace(hour=5))
+    assert transition == Transition(MONDAY.replace(hour=6), 'heat', 20.0)
+
+
+def test_continuation_entries_are_ignored():
+    index = ScheduleIndex()
+    index.update('T1', _schedule())
+    # The continuation entry at midnight on Monday is skipped
+    assert index.next_transition('T1', MONDAY).at == MONDAY.replace(hour=6)
+
+
+def test_next_transition_later_in_week():
+    index = ScheduleIndex()
+    index.update('T1', _schedule())
+    transition = index.next_transition('T1', MONDAY.replace(hour=23))
+    assert transition.at == datetime(2026, 10, 16, 7)
+    assert transition.temperature == 21.0
+
+
+def test_next_transition_wraps_to_next_week():
+    index = ScheduleIndex()
+    index.update('T1', _schedule())
+    transition = index.next_transition('T1', datetime(2026, 10, 18, 12))  # Sunday
+    assert transition.at == datetime(2026, 10, 19, 6)
+
+
+def test_range_entries():
+    index = ScheduleIndex()
+    schedule = {
+        'schedule_mode': 'RANGE',
+        'days': {'2': {'0': _entry(3600, mode='RANGE', **{'temp-min': 19, 'temp-max': 24})}},
+    }
+    index.update('T1', schedule)
+    transition = index.next_transition('T1', MONDAY, 'range')
+    assert transition == Transition(datetime(2026, 10, 14, 1), 'range', None, 19, 24)
+
+
+def test_mode_mismatch_and_unknown_serial():
+    index = ScheduleIndex()
+    index.update('T1', _schedule())
+    assert index.next_transition('T1', MONDAY, 'cool') is None
+    assert index.next_transition('T2', MONDAY) is None
+    index.update('T3', {})
+    assert index.next_transition('T3', MONDAY) is None
+
+
+def test_update_predictions():
+    index = ScheduleIndex()
+    index.update('T1', _schedule())
+    index.update('T2', _schedule())
+    assert index.update_predictions(MONDAY.replace(hour=5), {'T1': 'heat', 'T2': 'cool'})
+    assert index.predictions['T2'] is None
+    assert index.next_transition_time() == MONDAY.replace(hour=6)
+    assert not index.update_predictions(MONDAY.replace(hour=5, minute=30), {'T1': 'heat', 'T2': 'cool'})
+    assert index.update_predictions(MONDAY.replace(hour=7), {'T1': 'heat', 'T2': 'cool'})
+    assert index.next_transition_time() == MONDAY.replace(hour=22)
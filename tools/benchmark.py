@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+"""
+Offline benchmarks for NestWebDevice and the climate / sensor entities, using an in-process fake NestWebClient.
+
+Example::
+
+    python tools/benchmark.py --thermostats 3 10 50 --latency 0.05
+
+:author: Doug Skrypa
+"""
+
+import asyncio
+import logging
+import sys
+from argparse import ArgumentParser
+from datetime import datetime
+from pathlib import Path
+from statistics import mean
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+sys.path.insert(0, Path(__file__).resolve().parents[1].as_posix())
+
+from homeassistant.core import HomeAssistant
+
+from custom_components.nest_web.climate import NestThermostat
+from custom_components.nest_web.device import NestWebDevice, MIN_REFRESH_INTERVAL
+from custom_components.nest_web.sensor import THERMOSTAT_SENSOR_CLASSES, NestRefreshStatSensor
+
+from fake_nest import FakeNestWebClient
+
+log = logging.getLogger(__name__)
+
+
+def main():
+    parser = ArgumentParser(description='Benchmark the Nest Web integration against a fake Nest web client')
+    parser.add_argument('--structures', '-s', type=int, default=1, help='Number of structures per account')
+    parser.add_argument(
+        '--thermostats', '-t', type=int, nargs='+', default=[3, 10, 50], help='Thermostats per structure'
+    )
+    parser.add_argument('--latency', '-l', type=float, default=0.0, help='Simulated latency per request, in seconds')
+    parser.add_argument(
+        '--change-rate', '-c', type=float, default=0.1, help='Fraction of thermostats changed per refresh'
+    )
+    parser.add_argument('--error-rate', '-e', type=float, default=0.0, help='Fraction of requests that fail')
+    parser.add_argument('--iterations', '-i', type=int, default=100, help='Iterations for each repeated measurement')
+    parser.add_argument('--verbose', '-v', action='store_true', help='Show debug logging')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING, format='%(message)s')
+    for thermostats in args.thermostats:
+        results = asyncio.run(
+            benchmark(args.structures, thermostats, args.latency, args.change_rate, args.iterations, args.error_rate)
+        )
+        print(f'\n{args.structures} structure(s) x {thermostats} thermostat(s), latency={args.latency}s:')
+        for name, value in results.items():
+            print(f'  {name:>28s}: {value}')
+
+
+async def benchmark(
+    structures: int, thermostats: int, latency: float, change_rate: float, iterations: int, error_rate: float = 0.0
+):
+    with TemporaryDirectory() as config_dir:
+        hass = _create_hass(config_dir)
+        client = FakeNestWebClient(structures, thermostats, latency, change_rate)
+        nest_web_dev = NestWebDevice(hass, {'command_delay': 0}, client, 'benchmark')  # noqa
+        results = {}
+
+        start = perf_counter()
+        await nest_web_dev.initialize()
+        client.error_rate = error_rate  # Errors are only injected after setup, which does not retry
+        results['setup'] = _ms(perf_counter() - start)
+
+        start = perf_counter()
+        entities = _create_entities(hass, nest_web_dev)
+        results['entity creation'] = f'{_ms(perf_counter() - start)} for {len(entities)} entities'
+        for entity in entities:
+            await entity.async_added_to_hass()
+
+        start = perf_counter()
+        for _ in range(iterations):
+            for entity in entities:
+                entity._update_attrs()
+        elapsed = perf_counter() - start
+        results['per-entity update'] = f'{elapsed / (iterations * len(entities)) * 1_000_000:.2f} us'
+
+        state_writes = _count_state_writes(entities)
+        durations = []
+        for _ in range(iterations):
+            nest_web_dev.last_refresh = datetime.now() - MIN_REFRESH_INTERVAL
+            start = perf_counter()
+            await nest_web_dev.refresh()
+            durations.append(perf_counter() - start)
+        results['refresh'] = f'{_ms(mean(durations))} avg, {1 / mean(durations):,.1f} refreshes/s'
+        results['state writes per refresh'] = f'{sum(state_writes.values()) / iterations:.1f} of {len(entities)}'
+
+        thermostat_entities = [entity for entity in entities if isinstance(entity, NestThermostat)]
+        durations = []
+        for i in range(iterations):
+            entity = thermostat_entities[i % len(thermostat_entities)]
+            start = perf_counter()
+            await entity.async_set_temperature(temperature=18 + (i % 8))
+            durations.append(perf_counter() - start)
+        results['service call'] = f'{_ms(mean(durations))} avg, {_ms(max(durations))} max'
+
+        start = perf_counter()
+        await nest_web_dev.commands.flush()
+        commands = nest_web_dev.commands
+        results['command flush'] = f'{_ms(perf_counter() - start)} - sent {commands.sent} of {commands.submitted}'
+        if error_rate:
+            results['injected errors'] = f'{client.errors} of {client.requests} requests'
+
+        nest_web_dev.stop()
+        return results
+
+
+def _create_hass(config_dir: str) -> HomeAssistant:
+    try:
+        return HomeAssistant(config_dir)  # noqa
+    except TypeError:  # Older versions did not accept config_dir
+        hass = HomeAssistant()  # noqa
+        hass.config.config_dir = config_dir
+        return hass
+
+
+def _create_entities(hass: HomeAssistant, nest_web_dev: NestWebDevice):
+    """Mirrors the climate and sensor platforms' async_setup_entry functions, with every sensor enabled"""
+    entities = []
+    for structure, device, shared in nest_web_dev.struct_thermostat_groups:
+        entities.append(NestThermostat(nest_web_dev, structure, device, shared))
+        for cls in THERMOSTAT_SENSOR_CLASSES:
+            entities.extend(cls(nest_web_dev, structure, device, shared, var) for var in cls._types)
+
+    entry_id = nest_web_dev.entry_id
+    entities.extend(NestRefreshStatSensor(nest_web_dev, entry_id, var) for var in NestRefreshStatSensor._types)
+
+    for i, entity in enumerate(entities):
+        entity.hass = hass
+        entity.entity_id = f'{"climate" if isinstance(entity, NestThermostat) else "sensor"}.nest_web_{i}'
+    return entities
+
+
+def _count_state_writes(entities) -> dict[int, int]:
+    """Replace each entity's async_write_ha_state to count calls instead of writing to the state machine"""
+    state_writes = {}
+    for entity in entities:
+        key = id(entity)
+        state_writes[key] = 0
+
+        def write_state(key=key):
+            state_writes[key] += 1
+
+        entity.async_write_ha_state = write_state
+    return state_writes
+
+
+def _ms(seconds: float) -> str:
+    return f'{seconds * 1000:,.3f} ms'
+
+
+if __name__ == '__main__':
+    main()
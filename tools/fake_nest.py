@@ -0,0 +1,209 @@
+"""
+In-process fake of the parts of :class:`nest_client.client.NestWebClient` that the integration uses, for offline
+benchmarking.  Objects are generated for a configurable number of structures and thermostats, and every request can be
+delayed by a configurable latency, or fail at a configurable rate.  See ``nest_emulator.py`` for an HTTP-level emulator
+that exercises the real client.
+
+:author: Doug Skrypa
+"""
+
+from __future__ import annotations
+
+import logging
+from asyncio import sleep
+from itertools import count
+from random import Random
+from time import time
+from typing import Collection, Iterable
+
+from nest_client.entities import Structure, ThermostatDevice, Shared
+from nest_client.exceptions import NestException
+
+__all__ = ['FakeNestWebClient', 'FakeStructure', 'FakeThermostatDevice', 'FakeShared']
+log = logging.getLogger(__name__)
+
+HVAC_STATES = ('off', 'heating', 'cooling', 'fan running')
+
+
+class FakeObject:
+    """
+    Plain attribute-based stand-in for a nest_client object.  Instances report the real nest_client class as their
+    ``__class__`` (the same approach that ``unittest.mock`` uses for specs), so they pass the integration's isinstance
+    checks without depending on the library's internal value layout.
+    """
+
+    _spec_class = None
+    _revisions = count(1)
+
+    @property
+    def __class__(self):
+        return self._spec_class
+
+    def _init_object(self, client: FakeNestWebClient, obj_type: str, serial: str, **attrs):
+        self.client = client
+        self.serial = serial
+        self.key = f'{obj_type}.{serial}'
+        self.value = {}
+        for attr, val in attrs.items():
+            setattr(self, attr, val)
+        self._bump()
+
+    def _bump(self):
+        self.revision = next(self._revisions)
+        self.timestamp = int(time() * 1000)
+
+    async def _command(self, **changes):
+        await self.client.request(len(changes) * 64)
+        for attr, value in changes.items():
+            setattr(self, attr, value)
+        self._bump()
+
+
+class FakeStructure(FakeObject):
+    _spec_class = Structure
+
+    def __init__(self, client: FakeNestWebClient, serial: str, name: str):
+        self._init_object(client, 'structure', serial, name=name, away=False)
+        self.thermostats: list[tuple[FakeThermostatDevice, FakeShared]] = []
+
+    async def thermostats_and_shared(self):
+        await self.client.request(2048 * len(self.thermostats))
+        return list(self.thermostats)
+
+    async def set_away(self, away: bool):
+        await self._command(away=away)
+
+
+class FakeThermostatDevice(FakeObject):
+    _spec_class = ThermostatDevice
+    is_thermostat, is_camera = True, False
+
+    def __init__(self, client: FakeNestWebClient, serial: str, name: str):
+        self._init_object(
+            client,
+            'device',
+            serial,
+            name=name,
+            description=f'{name} Thermostat',
+            where=name,
+            humidity=45,
+            fan={'mode': 'auto'},
+            leaf=False,
+            has={'fan': True},
+            software_version='6.2-fake',
+        )
+
+    async def start_fan(self):
+        await self._command(fan={'mode': 'on'})
+
+    async def stop_fan(self):
+        await self._command(fan={'mode': 'auto'})
+
+
+class FakeShared(FakeObject):
+    _spec_class = Shared
+
+    def __init__(self, client: FakeNestWebClient, serial: str):
+        self._init_object(
+            client,
+            'shared',
+            serial,
+            hvac_state='off',
+            hvac_fan_state=False,
+            hvac_heater_state=False,
+            hvac_ac_state=False,
+            can_heat=True,
+            can_cool=True,
+            target_temperature_type='heat',
+            _target_temperature=20.0,
+            _target_temp_range=(19.0, 24.0),
+            _current_temperature=20.5,
+        )
+
+    async def set_temp(self, temp: float, convert: bool = True):
+        await self._command(_target_temperature=temp)
+
+    async def set_temp_range(self, low: float, high: float, convert: bool = True):
+        await self._command(_target_temp_range=(low, high))
+
+    async def set_mode(self, mode: str):
+        await self._command(target_temperature_type=mode)
+
+    def simulate_activity(self, rand: Random):
+        state = rand.choice(HVAC_STATES)
+        self.hvac_state = state
+        self.hvac_heater_state = state == 'heating'
+        self.hvac_ac_state = state == 'cooling'
+        self.hvac_fan_state = state != 'off'
+        self._current_temperature = round(self._current_temperature + rand.uniform(-0.5, 0.5), 1)
+        self._bump()
+
+
+class FakeNestWebClient:
+    """
+    :param structures: The number of structures to generate
+    :param thermostats: The number of thermostats to generate in each structure
+    :param latency: Seconds to wait before completing each request
+    :param change_rate: The fraction of thermostats whose shared objects change on each refresh
+    :param seed: Seed for the random changes applied on refresh, and for injected errors
+    :param error_rate: The fraction of requests that should fail with a NestException
+    """
+
+    def __init__(
+        self,
+        structures: int = 1,
+        thermostats: int = 3,
+        latency: float = 0.0,
+        change_rate: float = 0.1,
+        seed: int = 0,
+        error_rate: float = 0.0,
+    ):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.change_rate = change_rate
+        self.requests = 0
+        self.bytes_sent = 0
+        self.errors = 0
+        self._random = Random(seed)
+        self._known_objects = {}
+        for s in range(structures):
+            structure = FakeStructure(self, f'S{s:04d}', f'Home {s}')
+            self._add(structure)
+            for t in range(thermostats):
+                serial = f'T{s:04d}{t:04d}'
+                device, shared = FakeThermostatDevice(self, serial, f'Room {t}'), FakeShared(self, serial)
+                self._add(device)
+                self._add(shared)
+                structure.thermostats.append((device, shared))
+
+    def _add(self, obj: FakeObject):
+        self._known_objects[obj.key] = obj
+
+    async def request(self, response_size: int):
+        self.requests += 1
+        self.bytes_sent += response_size
+        if self.latency:
+            await sleep(self.latency)
+        if self.error_rate and self._random.random() < self.error_rate:
+            self.errors += 1
+            raise NestException('Emulated request failure')
+
+    async def get_init_objects(self) -> dict[str, FakeObject]:
+        await self.request(512 * len(self._known_objects))
+        return dict(self._known_objects)
+
+    async def refresh_known_objects(self):
+        await self.refresh_objects(self._known_objects.values())
+
+    async def refresh_objects(self, objects: Collection[FakeObject], subscribe: bool = True, send_all: bool = False):
+        await self.request(512 * len(objects))
+        self._simulate_changes(obj for obj in objects if isinstance(obj, FakeShared))
+
+    def _simulate_changes(self, shared_objects: Iterable[FakeShared]):
+        rand = self._random
+        for shared in shared_objects:
+            if rand.random() < self.change_rate:
+                shared.simulate_activity(rand)
+
+    async def aclose(self):
+        pass
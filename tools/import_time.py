@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+"""
+Measures how much the Nest Web integration adds to Home Assistant's import time.
+
+Each run uses a fresh interpreter.  The Home Assistant modules that are always imported during bootstrap are imported
+first, so that only the integration's own contribution (and the dependencies that it causes to be imported) is
+measured for each stage:
+
+- ``load``: importing the integration package, which happens even when there are no config entries
+- ``config_flow``: importing the config flow, which happens when the integration is added or its options are edited
+- ``setup_entry``: the modules imported when a config entry is set up
+- ``platforms``: the climate / sensor / diagnostics platforms
+
+Example::
+
+    python tools/import_time.py --runs 5 --detail 15
+
+:author: Doug Skrypa
+"""
+
+import json
+import subprocess
+import sys
+from argparse import ArgumentParser
+from pathlib import Path
+from statistics import median
+
+ROOT = Path(__file__).resolve().parents[1]
+PACKAGE = 'custom_components.nest_web'
+BASELINE_MODULES = (
+    'homeassistant.core',
+    'homeassistant.config_entries',
+    'homeassistant.helpers.config_validation',
+    'homeassistant.helpers.entity_platform',
+    'homeassistant.helpers.storage',
+)
+MARKER = 'nest_web-import-start'
+STAGES = {
+    'load': (PACKAGE,),
+    'config_flow': (f'{PACKAGE}.config_flow',),
+    'setup_entry': (f'{PACKAGE}.device', f'{PACKAGE}.services', f'{PACKAGE}.session'),
+    'platforms': (f'{PACKAGE}.climate', f'{PACKAGE}.sensor', f'{PACKAGE}.diagnostics'),
+}
+
+CHILD_CODE = """
+import json, sys
+from importlib import import_module
+from time import perf_counter
+
+sys.path.insert(0, {root!r})
+for module in {baseline!r}:
+    import_module(module)
+
+sys.stderr.write({marker!r} + '\\n')
+sys.stderr.flush()
+
+times = {{}}
+for stage, modules in {stages!r}.items():
+    start = perf_counter()
+    for module in modules:
+        import_module(module)
+    times[stage] = perf_counter() - start
+
+print(json.dumps(times))
+"""
+
+
+def main():
+    parser = ArgumentParser(description='Measure the import time that the Nest Web integration adds')
+    parser.add_argument('--runs', '-r', type=int, default=5, help='Number of fresh interpreters to measure')
+    parser.add_argument('--detail', '-d', type=int, default=0, metavar='N', help='Show the N slowest imported modules')
+    args = parser.parse_args()
+
+    code = CHILD_CODE.format(root=ROOT.as_posix(), baseline=BASELINE_MODULES, stages=STAGES, marker=MARKER)
+    runs = [json.loads(_run(code)) for _ in range(args.runs)]
+    print(f'Median import time over {args.runs} runs (after importing the Home Assistant bootstrap modules):')
+    for stage in STAGES:
+        times = [run[stage] for run in runs]
+        min_ms, max_ms = min(times) * 1000, max(times) * 1000
+        print(f'  {stage:<12s} {median(times) * 1000:8.1f} ms  ({min_ms=:.1f}, {max_ms=:.1f})')
+    print(f'  {"total":<12s} {median(sum(run.values()) for run in runs) * 1000:8.1f} ms')
+
+    if args.detail:
+        show_detail(code, args.detail)
+
+
+def show_detail(code: str, limit: int):
+    """Uses ``-X importtime`` to show which modules contribute the most to the integration's import time"""
+    stderr = _run(code, '-X', 'importtime', stream='stderr')
+    lines = stderr.splitlines()
+    modules = []
+    first = lines.index(MARKER) + 1
+    prefix = 'import time:'
+    prefix_end = len(prefix)
+    for line in lines[first:]:
+        if not line.startswith(prefix):
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[prefix_end:].split('|'))
+        if self_us.isdigit():  # Skip the header line
+            modules.append((int(self_us), int(cumulative_us), name))
+
+    print(f'\nSlowest {limit} modules imported by the integration (self time):')
+    for self_us, cumulative_us, name in sorted(modules, reverse=True)[:limit]:
+        print(f'  {self_us / 1000:8.1f} ms  (cumulative={cumulative_us / 1000:.1f} ms)  {name}')
+
+
+def _run(code: str, *options: str, stream: str = 'stdout') -> str:
+    result = subprocess.run([sys.executable, *options, '-c', code], capture_output=True, text=True, cwd=ROOT)
+    if result.returncode:
+        raise RuntimeError(f'Unable to import the integration:\n{result.stderr}')
+    return getattr(result, stream)
+
+
+if __name__ == '__main__':
+    main()
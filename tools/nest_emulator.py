@@ -0,0 +1,522 @@
+#!/usr/bin/env python
+"""
+Local emulator of the Nest web service endpoints that NestWebClient uses, for end-to-end testing of the integration on
+an offline machine.  It has three modes:
+
+- ``serve``: Serve synthetic objects for a configurable number of structures and thermostats.  Thermostat activity is
+  simulated periodically, and setters are applied.  Subscribe requests that ask for a long-poll (with a ``timeout`` in
+  the body or an ``X-nl-subscribe-timeout`` header, as push mode's requests do) are held open until something changes.
+  Other subscribe requests, such as the ones used for regular refreshes, return any changes immediately.
+- ``record``: Proxy requests to the real Nest / Google endpoints, and append each request / response pair to a JSON
+  lines fixture file.  Tokens, cookies, and email addresses are redacted from JSON and form-encoded bodies in the
+  fixture, and other bodies that appear to contain them are omitted.
+- ``replay``: Serve the responses from a fixture file, in the order that they were recorded for each endpoint.
+
+Every mode supports injected latency and errors.  Since the client always connects to the real hostnames over HTTPS,
+the integration is pointed at the emulator with the ``emulator`` option, which makes its dedicated session resolve
+every hostname to the emulator's address and skip certificate verification::
+
+    nest_web:
+      emulator: 127.0.0.1:8443
+
+Examples::
+
+    python tools/nest_emulator.py --self-signed serve --structures 5 --thermostats 20 --latency 0.1 --error-rate 0.02
+    python tools/nest_emulator.py --self-signed record fixtures/session.jsonl
+    python tools/nest_emulator.py --self-signed replay fixtures/session.jsonl --speed 2
+
+:author: Doug Skrypa
+"""
+
+import asyncio
+import json
+import logging
+import ssl
+import subprocess
+from argparse import ArgumentParser, Namespace
+from collections import defaultdict, deque
+from datetime import datetime, timedelta, timezone
+from itertools import count
+from pathlib import Path
+from random import Random
+from tempfile import TemporaryDirectory
+from time import monotonic, time
+from typing import Any, Optional
+from urllib.parse import parse_qsl, urlencode
+
+from aiohttp import ClientSession, web
+
+log = logging.getLogger(__name__)
+
+HVAC_STATES = ('off', 'heating', 'cooling')
+ERROR_STATUSES = (429, 500, 502, 503)
+# Keys that contain any of these (case-insensitive) are redacted, e.g., access_token, X-Nest-JWT, set_cookie, emails
+SENSITIVE_KEY_PARTS = ('token', 'jwt', 'cookie', 'password', 'secret', 'authorization', 'email', 'login_hint')
+FORM_CONTENT_TYPE = 'application/x-www-form-urlencoded'
+HOP_BY_HOP_HEADERS = {'connection', 'keep-alive', 'transfer-encoding', 'upgrade', 'host', 'content-length'}
+REDACTED = 'REDACTED'
+USER_ID = '1000001'
+
+
+def main():
+    parser = ArgumentParser(description='Local emulator of the Nest web service')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on')
+    parser.add_argument('--port', '-p', type=int, default=8443, help='Port to listen on')
+    tls_group = parser.add_mutually_exclusive_group()
+    tls_group.add_argument('--self-signed', '-S', action='store_true', help='Generate a temporary self-signed cert')
+    tls_group.add_argument('--certfile', help='TLS certificate (the client expects HTTPS)')
+    parser.add_argument('--keyfile', help='TLS private key, if it is not included in the certificate file')
+    parser.add_argument('--latency', '-l', type=float, default=0.0, help='Seconds to wait before each response')
+    parser.add_argument('--jitter', '-j', type=float, default=0.0, help='Maximum random seconds added to the latency')
+    parser.add_argument('--error-rate', '-e', type=float, default=0.0, help='Fraction of requests that fail')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for simulated activity, latency, and errors')
+    parser.add_argument('--verbose', '-v', action='store_true', help='Show debug logging')
+
+    subparsers = parser.add_subparsers(dest='mode', required=True)
+    serve_parser = subparsers.add_parser('serve', help='Serve synthetic objects')
+    serve_parser.add_argument('--structures', '-s', type=int, default=1, help='Number of structures')
+    serve_parser.add_argument('--thermostats', '-t', type=int, default=3, help='Thermostats per structure')
+    serve_parser.add_argument('--change-interval', '-c', type=float, default=30, help='Seconds between changes')
+    serve_parser.add_argument('--change-rate', '-r', type=float, default=0.1, help='Fraction of thermostats changed')
+    serve_parser.add_argument('--subscribe-hold', type=float, default=60, help='Max seconds to hold subscribe requests')
+
+    record_parser = subparsers.add_parser('record', help='Proxy to the real service and record a fixture')
+    record_parser.add_argument('fixture', help='Path of the JSON lines fixture file to append to')
+
+    replay_parser = subparsers.add_parser('replay', help='Replay a recorded fixture')
+    replay_parser.add_argument('fixture', help='Path of a fixture file created in record mode')
+    replay_parser.add_argument('--speed', type=float, default=1.0, help='Recorded response times are divided by this')
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO, format='%(asctime)s %(message)s')
+    with TemporaryDirectory() as tmp_dir:
+        ssl_context = _ssl_context(args, Path(tmp_dir))
+        web.run_app(create_app(args), host=args.host, port=args.port, ssl_context=ssl_context, print=log.info)
+
+
+def create_app(args: Namespace) -> web.Application:
+    app = web.Application(middlewares=[FaultInjector(args.latency, args.jitter, args.error_rate, args.seed).middleware])
+    if args.mode == 'serve':
+        model = NestModel(args.structures, args.thermostats, args.seed)
+        SyntheticHandler(model, args.subscribe_hold).register(app)
+        app.cleanup_ctx.append(model.simulation_ctx(args.change_interval, args.change_rate))
+    elif args.mode == 'record':
+        Recorder(Path(args.fixture)).register(app)
+    else:
+        Replayer(Path(args.fixture), args.speed).register(app)
+    return app
+
+
+class FaultInjector:
+    """Delays every response by the configured latency, and fails the configured fraction of requests"""
+
+    def __init__(self, latency: float, jitter: float, error_rate: float, seed: int):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self._random = Random(seed)
+
+    @web.middleware
+    async def middleware(self, request: web.Request, handler):
+        self.requests += 1
+        if delay := self.latency + self._random.uniform(0, self.jitter):
+            await asyncio.sleep(delay)
+        if self.error_rate and self._random.random() < self.error_rate:
+            self.errors += 1
+            status = self._random.choice(ERROR_STATUSES)
+            log.info(f'Injecting error {status} for {request.method} {request.host}{request.path}')
+            headers = {'Retry-After': '5'} if status == 429 else None
+            return web.json_response({'error': 'emulated failure'}, status=status, headers=headers)
+        return await handler(request)
+
+
+# region Synthetic Objects
+
+
+class NestModel:
+    """
+    Buckets for a configurable number of structures and thermostats, using the same key / revision / timestamp / value
+    layout as the real service.
+    """
+
+    def __init__(self, structures: int, thermostats: int, seed: int = 0):
+        self.objects: dict[str, dict[str, Any]] = {}
+        self._revisions = count(1)
+        self._random = Random(seed)
+        self._changed = asyncio.Event()
+        self._shared_keys = []
+
+        structure_keys = []
+        for s in range(structures):
+            structure_id = f'{s:08x}-0000-0000-0000-000000000000'
+            structure_keys.append(f'structure.{structure_id}')
+            serials = [f'02AA01AC{s:04d}{t:04d}' for t in range(thermostats)]
+            self._set(f'structure.{structure_id}', _structure(s, serials))
+            self._set(f'where.{structure_id}', {'wheres': [_where(t) for t in range(thermostats)]})
+            for t, serial in enumerate(serials):
+                self._set(f'device.{serial}', _device(t))
+                self._set(f'shared.{serial}', _shared(t))
+                self._set(f'schedule.{serial}', _schedule())
+                self._set(f'link.{serial}', {'structure': f'structure.{structure_id}'})
+                self._set(f'track.{serial}', {'online': True, 'last_connection': int(time() * 1000)})
+                self._shared_keys.append(f'shared.{serial}')
+
+        self._set(f'user.{USER_ID}', {'name': 'Emulated User', 'structures': structure_keys})
+
+    def _set(self, key: str, value: dict[str, Any]) -> dict[str, Any]:
+        self.objects[key] = obj = {
+            'object_key': key,
+            'object_revision': next(self._revisions),
+            'object_timestamp': int(time() * 1000),
+            'value': value,
+        }
+        return obj
+
+    def merge(self, key: str, value: dict[str, Any]) -> dict[str, Any]:
+        try:
+            current = self.objects[key]['value']
+        except KeyError as e:
+            raise web.HTTPNotFound(reason=f'Unknown object: {key}') from e
+        obj = self._set(key, {**current, **value})
+        self._notify()
+        return obj
+
+    def changed_objects(self, known: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """:return: The objects that changed since the given revisions were received"""
+        changed = []
+        for entry in known:
+            obj = self.objects.get(entry.get('object_key'))
+            if obj is not None and obj['object_revision'] != entry.get('object_revision'):
+                changed.append(obj)
+        return changed
+
+    async def wait_for_change(self, timeout: float):
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def _notify(self):
+        # Waiters hold a reference to the old event, so replacing it wakes each of them exactly once
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    # region Simulation
+
+    def simulation_ctx(self, interval: float, change_rate: float):
+        async def simulation_ctx(app: web.Application):
+            task = asyncio.create_task(self._simulate(interval, change_rate))
+            yield
+            task.cancel()
+
+        return simulation_ctx
+
+    async def _simulate(self, interval: float, change_rate: float):
+        rand = self._random
+        while True:
+            await asyncio.sleep(interval)
+            changed = 0
+            for key in self._shared_keys:
+                if rand.random() < change_rate:
+                    self._set(key, _simulate_activity(self.objects[key]['value'], rand))
+                    changed += 1
+            if changed:
+                log.debug(f'Simulated activity for {changed} thermostats')
+                self._notify()
+
+    # endregion
+
+
+def _structure(index: int, serials: list[str]) -> dict[str, Any]:
+    return {
+        'name': f'Home {index}',
+        'away': False,
+        'devices': [f'device.{serial}' for serial in serials],
+        'time_zone': 'America/New_York',
+        'postal_code': '10001',
+        'country_code': 'US',
+    }
+
+
+def _where(index: int) -> dict[str, str]:
+    return {'where_id': f'00000000-0000-0000-0000-0001{index:08x}', 'name': f'Room {index}'}
+
+
+def _device(index: int) -> dict[str, Any]:
+    return {
+        'where_id': _where(index)['where_id'],
+        'current_humidity': 45,
+        'fan_mode': 'auto',
+        'fan_timer_timeout': 0,
+        'has_fan': True,
+        'leaf': False,
+        'temperature_scale': 'C',
+        'current_version': '6.2-emulated',
+        'hvac_wires': 'Heat,Cool,Fan',
+    }
+
+
+def _shared(index: int) -> dict[str, Any]:
+    return {
+        'name': f'Room {index}',
+        'current_temperature': 20.5,
+        'target_temperature': 20.0,
+        'target_temperature_low': 19.0,
+        'target_temperature_high': 24.0,
+        'target_temperature_type': 'heat',
+        'target_change_pending': False,
+        'hvac_heater_state': False,
+        'hvac_ac_state': False,
+        'hvac_fan_state': False,
+        'can_heat': True,
+        'can_cool': True,
+    }
+
+
+def _schedule() -> dict[str, Any]:
+    day_entries = {
+        '0': {'entry_type': 'setpoint', 'time': 6 * 3600, 'type': 'HEAT', 'temp': 20.0},
+        '1': {'entry_type': 'setpoint', 'time': 22 * 3600, 'type': 'HEAT', 'temp': 17.0},
+    }
+    days = {str(day): day_entries for day in range(7)}
+    return {'ver': 2, 'schedule_mode': 'HEAT', 'name': 'Emulated Schedule', 'days': days}
+
+
+def _simulate_activity(shared: dict[str, Any], rand: Random) -> dict[str, Any]:
+    state = rand.choice(HVAC_STATES)
+    return {
+        **shared,
+        'hvac_heater_state': state == 'heating',
+        'hvac_ac_state': state == 'cooling',
+        'hvac_fan_state': state != 'off',
+        'current_temperature': round(shared['current_temperature'] + rand.uniform(-0.5, 0.5), 1),
+    }
+
+
+class SyntheticHandler:
+    """Handlers for the authentication, app_launch, subscribe, and put endpoints, backed by a NestModel"""
+
+    def __init__(self, model: NestModel, subscribe_hold: float):
+        self.model = model
+        self.subscribe_hold = subscribe_hold
+
+    def register(self, app: web.Application):
+        app.router.add_get('/o/oauth2/iframerpc', self.issue_token)
+        app.router.add_post('/v1/issue_jwt', self.issue_jwt)
+        app.router.add_post('/session', self.session)
+        app.router.add_post('/api/0.1/user/{user_id}/app_launch', self.app_launch)
+        app.router.add_post('/v6/subscribe', self.subscribe)
+        app.router.add_post('/v5/subscribe', self.subscribe)
+        app.router.add_post('/v5/put', self.put)
+
+    async def issue_token(self, request: web.Request) -> web.Response:
+        return web.json_response({'access_token': 'emulated-access-token', 'token_type': 'Bearer', 'expires_in': 3600})
+
+    async def issue_jwt(self, request: web.Request) -> web.Response:
+        expiry = datetime.now(timezone.utc) + timedelta(hours=1)
+        return web.json_response(
+            {
+                'jwt': 'emulated-jwt',
+                'claims': {
+                    'subject': {'nestId': {'id': USER_ID}},
+                    'expirationTime': expiry.isoformat().replace('+00:00', 'Z'),
+                },
+            }
+        )
+
+    async def session(self, request: web.Request) -> web.Response:
+        expiry = datetime.now(timezone.utc) + timedelta(hours=1)
+        return web.json_response(
+            {
+                'userid': USER_ID,
+                'user': f'user.{USER_ID}',
+                'access_token': 'emulated-access-token',
+                'expires_in': expiry.strftime('%a, %d-%b-%Y %H:%M:%S GMT'),
+                'urls': {'transport_url': f'https://{request.host}'},
+            }
+        )
+
+    async def app_launch(self, request: web.Request) -> web.Response:
+        body = await _read_json(request)
+        bucket_types = set(body.get('known_bucket_types') or ())
+        buckets = [
+            obj for key, obj in self.model.objects.items() if not bucket_types or key.split('.', 1)[0] in bucket_types
+        ]
+        return web.json_response(
+            {
+                'updated_buckets': buckets,
+                'service_urls': {'urls': {'transport_url': f'https://{request.host}'}},
+                'weather_for_structures': {},
+            }
+        )
+
+    async def subscribe(self, request: web.Request) -> web.Response:
+        body = await _read_json(request)
+        known = body.get('objects') or []
+        long_poll = 'timeout' in body or 'X-nl-subscribe-timeout' in request.headers
+        if not (changed := self.model.changed_objects(known)) and long_poll:
+            await self.model.wait_for_change(self.subscribe_hold)
+            changed = self.model.changed_objects(known)
+        return web.json_response({'objects': changed})
+
+    async def put(self, request: web.Request) -> web.Response:
+        objects = []
+        for entry in (await _read_json(request)).get('objects') or []:
+            obj = self.model.merge(entry['object_key'], entry.get('value') or {})
+            log.info(f'Applied {entry.get("op", "MERGE")} to {obj["object_key"]}: {entry.get("value")}')
+            objects.append({key: val for key, val in obj.items() if key != 'value'})
+        return web.json_response({'objects': objects})
+
+
+async def _read_json(request: web.Request) -> dict[str, Any]:
+    if not request.can_read_body:
+        return {}
+    try:
+        return await request.json()
+    except ValueError as e:
+        raise web.HTTPBadRequest(reason=f'Invalid JSON body: {e}') from e
+
+
+# endregion
+
+# region Record / Replay
+
+
+class Recorder:
+    """
+    Forwards each request to the host that the client intended to reach (from the Host header) and appends the
+    exchange to a fixture file.  The client receives the real, unredacted response.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._session: Optional[ClientSession] = None
+
+    def register(self, app: web.Application):
+        app.router.add_route('*', '/{path:.*}', self.proxy)
+        app.cleanup_ctx.append(self._session_ctx)
+
+    async def _session_ctx(self, app: web.Application):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        async with ClientSession(auto_decompress=True) as self._session:
+            with self.path.open('a', encoding='utf-8') as self._file:
+                yield
+
+    async def proxy(self, request: web.Request) -> web.Response:
+        body = await request.read()
+        headers = {key: val for key, val in request.headers.items() if key.lower() not in HOP_BY_HOP_HEADERS}
+        headers.pop('Accept-Encoding', None)
+        start = monotonic()
+        url = f'https://{request.host}{request.path_qs}'
+        kwargs = {'data': body, 'headers': headers, 'allow_redirects': False}
+        async with self._session.request(request.method, url, **kwargs) as resp:
+            data = await resp.read()
+            status, content_type = resp.status, resp.content_type
+
+        entry = {
+            'method': request.method,
+            'host': request.host,
+            'path': request.path,
+            'request': _redact(_decode(body, request.content_type)),
+            'status': status,
+            'content_type': content_type,
+            'response': _redact(_decode(data, content_type)),
+            'elapsed': round(monotonic() - start, 3),
+        }
+        self._file.write(json.dumps(entry, separators=(',', ':')) + '\n')
+        self._file.flush()
+        log.info(f'Recorded {request.method} {request.host}{request.path} -> {status} ({entry["elapsed"]}s)')
+        return web.Response(body=data, status=status, content_type=content_type)
+
+
+class Replayer:
+    """
+    Serves recorded responses for each method / host / path in the order that they were recorded.  When the recorded
+    responses for an endpoint are exhausted, the last one is repeated.
+    """
+
+    def __init__(self, path: Path, speed: float = 1.0):
+        self.speed = speed
+        self.responses: dict[tuple[str, str, str], deque[dict[str, Any]]] = defaultdict(deque)
+        with path.open('r', encoding='utf-8') as f:
+            for line in filter(None, map(str.strip, f)):
+                entry = json.loads(line)
+                self.responses[(entry['method'], entry['host'], entry['path'])].append(entry)
+        log.info(f'Loaded {sum(map(len, self.responses.values()))} responses for {len(self.responses)} endpoints')
+
+    def register(self, app: web.Application):
+        app.router.add_route('*', '/{path:.*}', self.replay)
+
+    async def replay(self, request: web.Request) -> web.Response:
+        await request.read()
+        if not (responses := self.responses.get((request.method, request.host, request.path))):
+            log.warning(f'No recorded response for {request.method} {request.host}{request.path}')
+            raise web.HTTPNotFound()
+
+        entry = responses.popleft() if len(responses) > 1 else responses[0]
+        if self.speed > 0:
+            await asyncio.sleep(entry['elapsed'] / self.speed)
+        response, content_type = entry['response'], entry['content_type']
+        if isinstance(response, str) or response is None:
+            body = response
+        elif content_type == FORM_CONTENT_TYPE:
+            body = urlencode(response)
+        else:
+            body = json.dumps(response)
+        return web.Response(text=body, status=entry['status'], content_type=content_type)
+
+
+def _decode(data: bytes, content_type: str = None):
+    if not data:
+        return None
+    text = data.decode('utf-8', 'replace')
+    if content_type == FORM_CONTENT_TYPE:
+        return dict(parse_qsl(text, keep_blank_values=True))
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def _is_sensitive(key: str) -> bool:
+    key = key.lower()
+    return any(part in key for part in SENSITIVE_KEY_PARTS)
+
+
+def _redact(value, key: str = None):
+    if isinstance(value, dict):
+        return {k: _redact(v, k) for k, v in value.items()}
+    elif isinstance(value, list):
+        return [_redact(v, key) for v in value]
+    elif key and value and _is_sensitive(key):
+        return REDACTED
+    elif key is None and isinstance(value, str) and _is_sensitive(value):
+        # The body could not be parsed, so any sensitive values in it cannot be redacted individually
+        return REDACTED
+    return value
+
+
+# endregion
+
+
+def _ssl_context(args: Namespace, tmp_dir: Path) -> Optional[ssl.SSLContext]:
+    if args.self_signed:
+        certfile, keyfile = tmp_dir.joinpath('cert.pem'), tmp_dir.joinpath('key.pem')
+        cmd = ['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1', '-subj', '/CN=nest-emulator']
+        cmd += ['-keyout', keyfile.as_posix(), '-out', certfile.as_posix()]
+        subprocess.run(cmd, check=True, capture_output=True)
+    elif args.certfile:
+        certfile, keyfile = args.certfile, args.keyfile
+    else:
+        log.warning('Serving plain HTTP - the client will not be able to connect unless it is using HTTP URLs')
+        return None
+
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(certfile, keyfile)
+    return context
+
+
+if __name__ == '__main__':
+    main()